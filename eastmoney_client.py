@@ -0,0 +1,175 @@
+"""
+东方财富接口公共工具。
+
+说明：
+- 证券代码规范化、东财 secid（市场前缀.代码）推断、交易所代码推断
+- 东财 K 线接口请求（共享连接池 Session，首次请求时才导入 requests）与响应解析（纯 JSON，兼容 JSONP）
+- get_realtime / ingest_eastmoney_daily_to_mysql / tushare_mcp 共用同一套规则，避免各自维护
+
+示例：
+    >>> from eastmoney_client import get_secid, infer_exch_code
+    >>> get_secid("159218.SZ")
+    '0.159218'
+    >>> infer_exch_code("512400")
+    'SH'
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+import threading
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import requests
+
+# orjson 可选：安装了就用（C 实现，更快），否则回退标准库 json
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+_NON_DIGIT_RE = re.compile(r"\D")
+
+KLINE_URL = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
+
+# 日线 K 线请求的固定参数（前复权；end 取远期日期即截止到最新一根），
+# 调用方只需合并 secid / lmt / _：params = DAILY_KLINE_PARAMS | {...}
+DAILY_KLINE_PARAMS = {
+    "ut": "fa5fd1943c7b386f172d6893dbfba10b",
+    "fields1": "f1,f2,f3,f4,f5,f6",
+    "fields2": "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61",
+    "klt": "101",  # 日线
+    "fqt": "1",  # 前复权
+    "end": "20500101",
+}
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/136.0.0.0 Safari/537.36"
+)
+
+# 共享 Session，由 get_session() 懒加载
+_SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
+
+# 深市 2 位前缀：主板 00x（含中小板 002）/ 创业板 30x（含 301）/ ETF、LOF 15x/16x/18x
+SZ_PREFIXES = frozenset({"00", "30", "15", "16", "18"})
+# 北交所首位前缀（东财 secid 市场归为 0）
+BJ_PREFIX = "8"
+# 沪市 2 位前缀：主板 60x / ETF 50x、51x、56x、58x
+SH_PREFIXES = frozenset({"60", "50", "51", "56", "58"})
+# 沪市 3 位前缀：科创板 688
+SH_PREFIXES_3 = frozenset({"688"})
+
+
+# 关注的标的集合很小且固定，代码规则结果按输入缓存，重复调用只是一次字典查找
+@functools.lru_cache(maxsize=4096)
+def normalize_code(code: str) -> str:
+    """规范化证券代码：支持 '159218' / '159218.SZ' / '159218.sz'，只保留 6 位数字。"""
+    s = str(code).strip()
+    digits = _NON_DIGIT_RE.sub("", s)
+    if len(digits) < 6:
+        raise ValueError(f"无法解析证券代码: {code}")
+    return digits[:6]
+
+
+def is_sh_code(code6: str) -> bool:
+    """6 位代码是否属于沪市。"""
+    return code6[:2] in SH_PREFIXES or code6[:3] in SH_PREFIXES_3
+
+
+@functools.lru_cache(maxsize=4096)
+def get_secid(code: str) -> str:
+    """
+    根据证券代码推断东财 secid（市场前缀.代码）。
+
+    说明：
+    - 深市：0.xxxxxx（含深市股票、深市 ETF 如 159xxx、北交所 8xxxxx）
+    - 沪市：1.xxxxxx（含沪市股票、沪市 ETF 如 510xxx/588xxx 等）
+    """
+    code6 = normalize_code(code)
+
+    if code6[:2] in SZ_PREFIXES or code6.startswith(BJ_PREFIX):
+        return f"0.{code6}"
+
+    if is_sh_code(code6):
+        return f"1.{code6}"
+
+    raise ValueError(f"无法识别证券代码的市场类型: {code}")
+
+
+def infer_exch_code(code6: str) -> str:
+    """根据 6 位代码推断交易所代码（SH/SZ/BJ，仅用于落库标识）。"""
+    if is_sh_code(code6):
+        return "SH"
+    if code6.startswith(BJ_PREFIX):
+        return "BJ"
+    # 其它默认深市（含深市 ETF 159xxx）
+    return "SZ"
+
+
+def parse_payload(body: bytes) -> Any:
+    """
+    解析东财接口响应体。
+
+    说明：
+    - 请求不带 cb 参数时东财直接返回 JSON，直接解析
+    - 兼容仍返回 JSONP（jQueryxxx_yyy({...});）的情况：直接在 bytes 上取第一个 '(' 与最后一个 ')'
+      之间的内容解析，不解码整段响应、也不用正则扫描
+    """
+    if body.lstrip()[:1] == b"{":
+        return _json.loads(body)
+
+    start = body.find(b"(")
+    end = body.rfind(b")")
+    if start < 0 or end <= start:
+        raise ValueError("无法解析东财响应")
+    return _json.loads(body[start + 1 : end])
+
+
+def get_session() -> requests.Session:
+    """
+    获取东财请求共用的 Session（首次调用时创建）。
+
+    说明：
+    - 延迟到第一次真正发请求时才导入 requests，只用到代码规则的脚本不承担导入开销
+    - keep-alive 省掉每次请求的 TCP/TLS 握手；遇到限流/服务端错误时由 HTTPAdapter 按指数退避自动重试
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                session = requests.Session()
+                session.mount(
+                    "https://",
+                    HTTPAdapter(
+                        pool_connections=10,
+                        pool_maxsize=20,
+                        max_retries=Retry(
+                            total=3,
+                            backoff_factor=0.2,
+                            status_forcelist=[429, 500, 502, 503, 504],
+                        ),
+                    ),
+                )
+                # K 线 JSON 是高度重复的文本，显式声明接受 gzip（响应体约缩小 3~4 倍），
+                # requests/urllib3 会按 Content-Encoding 自动解压，resp.content 即为解压后的字节
+                session.headers.update(
+                    {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
+                )
+                _SESSION = session
+    return _SESSION
+
+
+def fetch_kline_payload(params: dict[str, str], timeout: float = 15) -> Any:
+    """请求东财 K 线接口并返回解析后的 JSON。"""
+    resp = get_session().get(KLINE_URL, params=params, timeout=timeout)
+    resp.raise_for_status()
+    return parse_payload(resp.content)
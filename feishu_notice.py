@@ -1,8 +1,14 @@
-import json
+import threading
 import time
 
 import requests
 
+# orjson 可选：安装了就用（C 实现，更快），否则回退标准库 json
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 # 导入日志配置
 from logger_config import get_logger
 
@@ -16,6 +22,15 @@ FEISHU_BOT_URL = (
 
 LARK_MSG_TIMEOUT = 3  # 请求超时时间
 NOTIFY_MSG_ENV_PREFIX = "【简单的提醒】"  # 消息前缀
+FAILURE_ALERT_INTERVAL = 60  # 发送失败告警的最小间隔（秒），期间的失败合并计数
+
+# 复用到飞书的 keep-alive 连接，避免每条消息重新握手
+_SESSION = requests.Session()
+
+# 发送失败告警的限流状态（多线程共用，需加锁）
+_FAILURE_LOCK = threading.Lock()
+_last_failure_alert = float("-inf")
+_failure_count = 0
 
 
 def send_to_lark(
@@ -43,9 +58,9 @@ def send_to_lark(
 
     for attempt in range(retry_count + 1):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 url=FEISHU_BOT_URL,
-                data=json.dumps(
+                data=_json.dumps(
                     {
                         "msg_type": "text",
                         "content": {
@@ -63,7 +78,7 @@ def send_to_lark(
                 timeout=LARK_MSG_TIMEOUT,
             )
 
-            response_obj = response.json()
+            response_obj = _json.loads(response.content)
 
             # 检查响应状态
             if response.status_code == 200 and response_obj.get("StatusCode") == 0:
@@ -83,9 +98,29 @@ def send_to_lark(
 
     # 所有重试都失败了
     if not is_error:
-        # 普通消息重试失败后，发送一条错误消息（只发一次，不重试）
-        send_to_lark(f"{message}重试失败", is_error=True)
+        # 普通消息重试失败后，发送一条错误消息（不重试）；
+        # 飞书持续不可用时按 FAILURE_ALERT_INTERVAL 限流，期间的失败合并到下一条告警里
+        _report_failure(message)
     else:
         # 发送失败消息失败，不重试
         logger.error(f"【失败消息】飞书通知发送失败，错误消息不重试")
     return False
+
+
+def _report_failure(message: str) -> None:
+    """记录一次发送失败，距上次告警超过 FAILURE_ALERT_INTERVAL 时发送一条汇总告警。"""
+    global _last_failure_alert, _failure_count
+
+    with _FAILURE_LOCK:
+        _failure_count += 1
+        now = time.monotonic()
+        if now - _last_failure_alert < FAILURE_ALERT_INTERVAL:
+            logger.warning(f"飞书通知发送失败，已合并到下一条失败告警（累计 {_failure_count} 条）")
+            return
+        _last_failure_alert = now
+        count, _failure_count = _failure_count, 0
+
+    alert = f"{message}重试失败"
+    if count > 1:
+        alert += f"\n（最近共 {count} 条消息发送失败）"
+    send_to_lark(alert, is_error=True)
@@ -0,0 +1,67 @@
+"""
+本地文件缓存（JSON + TTL）。
+
+用途：
+- 缓存东财等外部接口的返回，短时间内重复运行脚本时跳过 HTTP 请求
+- 每个 key 对应 .cache/ 目录下的一个 JSON 文件，过期判断基于文件修改时间
+
+示例：
+    >>> from file_cache import FileCache
+    >>> cache = FileCache(ttl_seconds=300)
+    >>> cache.set("0.159218|120", [{"trade_date": "2025-01-02"}])
+    >>> cache.get("0.159218|120")
+    [{'trade_date': '2025-01-02'}]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".cache"
+
+
+class FileCache:
+    """以 key 的 MD5 为文件名、JSON 为内容的简单文件缓存。"""
+
+    def __init__(
+        self, cache_dir: str | Path = DEFAULT_CACHE_DIR, ttl_seconds: float = 300
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, key: str, ttl_seconds: float | None = None) -> Any | None:
+        """读取缓存；不存在、已过期或内容损坏时返回 None。"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存（先写临时文件再原子替换，避免并发读到半截内容）。"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
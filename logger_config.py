@@ -3,10 +3,30 @@
 提供统一的日志配置，支持同时输出到文件和控制台
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
 from datetime import datetime
 
+# 每个 logger 对应一个后台写日志的 QueueListener（name -> listener）
+_LISTENERS: dict[str, logging.handlers.QueueListener] = {}
+
+# 单个日志文件上限与保留的备份数
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUP_COUNT = 5
+
+
+def _stop_listeners() -> None:
+    """进程退出时停止所有 listener，确保队列中剩余日志写完。"""
+    for listener in list(_LISTENERS.values()):
+        listener.stop()
+    _LISTENERS.clear()
+
+
+atexit.register(_stop_listeners)
+
 
 def setup_logging(
     name: str = "stock_monitor",
@@ -18,6 +38,12 @@ def setup_logging(
 ) -> logging.Logger:
     """
     配置日志系统，同时输出到文件和控制台
+
+    说明：
+    - logger 上只挂一个 QueueHandler，调用方线程只做一次入队
+    - 真正的文件/控制台写入由后台 QueueListener 线程完成，磁盘 I/O 不阻塞业务线程
+    - 文件按大小滚动（LOG_MAX_BYTES / LOG_BACKUP_COUNT），避免单个日志无限增长
+    - 只写文件、不打印到控制台：logger.info(..., extra={"file_only": True})
     
     Args:
         name: logger 名称
@@ -49,23 +75,39 @@ def setup_logging(
     logger = logging.getLogger(name)
     logger.setLevel(log_level)
     
-    # 清除所有已存在的 handlers，避免重复
+    # 清除所有已存在的 handlers，避免重复；旧的 listener 先停掉（会把剩余日志写完）
     logger.handlers.clear()
-
-    # 文件 handler（记录所有日志）
-    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    old_listener = _LISTENERS.pop(name, None)
+    if old_listener is not None:
+        old_listener.stop()
+
+    # 文件 handler（记录所有日志，按大小滚动）
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
     file_handler.setLevel(log_level)
     file_formatter = logging.Formatter(log_format, datefmt=date_format)
     file_handler.setFormatter(file_formatter)
 
     # 控制台 handler（只显示重要信息，格式简洁）
+    # 带 extra={"file_only": True} 的日志（如 AI 完整分析）只写文件，不打印到控制台
     console_handler = logging.StreamHandler()
     console_handler.setLevel(console_level)
+    console_handler.addFilter(lambda record: not getattr(record, "file_only", False))
     console_formatter = logging.Formatter("%(message)s")
     console_handler.setFormatter(console_formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # 业务线程只入队，后台线程按各 handler 自己的级别分发
+    log_queue: queue.Queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    _LISTENERS[name] = listener
     
     # 阻止日志传播到根 logger，避免重复输出
     logger.propagate = False
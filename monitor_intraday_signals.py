@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import time as dtime
 from datetime import timedelta, timezone
 from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # 导入日志配置
 from logger_config import setup_monitor_logging
@@ -40,48 +42,131 @@ except ImportError:
     logger.warning("未找到 feishu_notice 模块，飞书通知功能将被禁用")
 
 
+# 北京时区（模块加载时创建一次）；系统缺少时区数据库时退回固定 UTC+8
+try:
+    _BJ_TZ = ZoneInfo("Asia/Shanghai")
+except ZoneInfoNotFoundError:
+    _BJ_TZ = timezone(timedelta(hours=8))
+
+# 交易时段边界（北京时间）
+_AM_OPEN = dtime(9, 30)
+_AM_CLOSE = dtime(11, 30)
+_PM_OPEN = dtime(13, 0)
+_PM_CLOSE = dtime(15, 0)
+
+# 做T信号的控制台/飞书消息模板（分隔线与各行在模块加载时拼好，输出时只做一次 format_map）
+_EQ50 = "=" * 50
+_DASH50 = "─" * 50
+_T_SIGNAL_MSG_TEMPLATE = "\n".join(
+    [
+        "",
+        _EQ50,
+        "⏰ {time}  |  {code}",
+        _EQ50,
+        "{action}  【{signal}】",
+        _DASH50,
+        "💰 执行价格: {exec_price}",
+        "📊 建议数量: {size}",
+        "🛡️ 止损价格: {stop_loss}",
+        "🎯 目标价格: {target}",
+        _DASH50,
+        "💡 原因: {reason}",
+        _EQ50,
+        "",
+    ]
+)
+
+
 def _beijing_now() -> datetime:
     """获取北京时间（不带时区信息，便于打印和比较）。"""
-    now_utc = datetime.now(timezone.utc)
-    bj = now_utc + timedelta(hours=8)
-    return bj.replace(tzinfo=None)
+    return datetime.now(_BJ_TZ).replace(tzinfo=None)
 
 
 def _is_trading_time_bj(dt: datetime) -> bool:
     """判断是否处于交易时段（北京时间）。"""
     t = dt.time()
-    am = dtime(9, 30) <= t <= dtime(11, 30)
-    pm = dtime(13, 0) <= t <= dtime(15, 0)
-    return am or pm
+    return _AM_OPEN <= t <= _AM_CLOSE or _PM_OPEN <= t <= _PM_CLOSE
 
 
-def _extract_field(report: str, field_name: str) -> str | None:
+# 报告字段的单遍解析正则（一次 finditer 取出全部字段），两种格式：
+# 1. Markdown: '- **信号**: 买入'
+# 2. 纯文本（行首或空白/图标之后）: '📍 执行价格: 1.625'
+_FIELD_PREFIX_CHARS = r"\s\-📍💰📊🛡️🎯💡"
+_REPORT_FIELD_RE = re.compile(
+    r"\*\*(?P<md_key>[^*\n]+)\*\*:[ \t]*(?P<md_val>[^\n]*)"
+    rf"|(?:^|[{_FIELD_PREFIX_CHARS}])[ \t]*(?P<key>[^{_FIELD_PREFIX_CHARS}:：*]+):[ \t]*(?P<val>[^\n]*)",
+    re.MULTILINE,
+)
+
+
+# AI 详细日志的格式清理：每行行首空白（报告来自缩进的多行字符串），以及 "- **字段**" 前的 "- "
+_AI_REPORT_INDENT_RE = re.compile(r"^[^\S\n]*(?:- (?=\*\*))?", re.MULTILINE)
+
+# 报告中代表"获取信号失败"的标记，合成一个正则一次扫描
+_REPORT_ERROR_RE = re.compile(
+    "|".join(
+        map(re.escape, ["分析过程中出错", "未在 MySQL 中找到", "未查询到东财行情数据"])
+    )
+)
+
+
+def _parse_report(report: str) -> dict[str, str]:
     """
-    从报告里提取字段。
-    支持两种格式：
-    1. Markdown: '- **信号**: 买入'
-    2. 纯文本: '📍 执行价格: 1.625'
+    一次扫描解析报告里的全部字段，返回 {字段名: 值}。
+
+    说明：
+    - 同名字段取第一次出现的值
+    - Markdown 格式优先于纯文本格式（与逐字段先查 markdown 再查纯文本的语义一致）
     """
-    # 尝试匹配 markdown 格式：**field_name**: value
-    pattern1 = rf"\*\*{re.escape(field_name)}\*\*:\s*([^\n]+)"
-    m = re.search(pattern1, report)
-    if m:
-        value = m.group(1).strip()
-        if value and not value.startswith("- **"):
-            return value
+    markdown: dict[str, str] = {}
+    plain: dict[str, str] = {}
+    for m in _REPORT_FIELD_RE.finditer(report):
+        if m.group("md_key") is not None:
+            value = m.group("md_val").strip()
+            # 值为空或以 "- **" 开头（实际是下一行的字段）时丢弃
+            if value and value[:4] != "- **":
+                markdown.setdefault(m.group("md_key"), value)
+        else:
+            value = m.group("val").strip()
+            if value:
+                plain.setdefault(m.group("key"), value)
+    plain.update(markdown)
+    return plain
+
 
-    # 尝试匹配纯文本格式（可能带图标）：执行价格: value 或 📍 执行价格: value
-    pattern2 = rf"(?:^|[\s\-📍💰📊🛡️🎯💡])\s*{re.escape(field_name)}:\s*([^\n]+)"
-    m = re.search(pattern2, report, re.MULTILINE)
-    if m:
-        value = m.group(1).strip()
-        if value:
-            return value
+def _extract_field(report: str, field_name: str) -> str | None:
+    """从报告里提取单个字段（需要多个字段时直接用 _parse_report，只扫描一次）。"""
+    return _parse_report(report).get(field_name)
 
-    return None
 
+def _fetch_report(
+    code: str,
+    use_t_signal: bool,
+    enable_deepseek: bool,
+    position_costs: dict[str, float],
+    position_ratios: dict[str, float],
+) -> tuple[str, str, str]:
+    """
+    获取单个标的的信号报告（在线程池中执行，只做网络请求，不做打印/通知）。
 
-def main() -> int:
+    返回：(report, 信号字段名, 原因字段名)
+    """
+    # 根据配置选择使用标准信号还是做T信号
+    if use_t_signal and enable_deepseek:
+        # 使用 DeepSeek 做T信号（新版简化指令）
+        report = deepseek_intraday_t_signal(
+            code=code,
+            position_cost=position_costs.get(code),
+            position_ratio=position_ratios.get(code, 0.0),
+        )
+        return report, "操作指令", "核心原因"
+
+    # 使用标准规则策略信号
+    report = intraday_trade_signal(code=code)
+    return report, "信号", "依据"
+
+
+async def _main_async() -> int:
     # =========================
     # 配置区：按需修改即可（不通过命令行传参）
     # =========================
@@ -110,7 +195,10 @@ def main() -> int:
         logger.error("未提供 codes")
         return 2
 
-    last_printed: dict[str, str] = {}  # code -> last_signal_printed
+    # code -> last_signal_printed
+    # 不需要加锁：工作线程只负责拉取报告，last_printed 的读写全部在事件循环线程里按 codes 顺序进行；
+    # 且每个 code 只读写自己的 key。以后如果把处理逻辑挪进工作线程，也要保持"一个 code 只由一个线程处理"
+    last_printed: dict[str, str] = {}
 
     logger.info(f"开始盯盘：codes={codes} interval={interval}s")
     if use_t_signal:
@@ -126,48 +214,52 @@ def main() -> int:
     if enable_deepseek:
         logger.info("DeepSeek AI 辅助分析已启用")
 
+    # 信号接口都是同步阻塞调用（requests），放到常驻线程池里执行，事件循环只负责调度
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=min(16, len(codes)))
+
+    # 按绝对时间排期（loop.time() 为单调时钟）：每轮耗时不会累积成漂移
+    next_tick = loop.time()
     while True:
-        start = time.time()
+        next_tick += interval
         now_bj = _beijing_now()
 
         if all_day or _is_trading_time_bj(now_bj):
-            for code in codes:
+            # 各标的的信号请求（东财行情 + DeepSeek）并发执行，单轮耗时取决于最慢的一个；
+            # 结果按 codes 顺序逐个处理，打印、飞书通知和 last_printed 的读写不会交错
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        executor,
+                        _fetch_report,
+                        code,
+                        use_t_signal,
+                        enable_deepseek,
+                        position_costs,
+                        position_ratios,
+                    )
+                    for code in codes
+                ),
+                return_exceptions=True,
+            )
+            # 时间戳每轮只格式化一次，各标的复用（HH:MM:SS 直接切片，不再二次 strftime）
+            now_str = now_bj.strftime("%Y-%m-%d %H:%M:%S")
+            for code, result in zip(codes, results):
                 try:
-                    # 根据配置选择使用标准信号还是做T信号
-                    if use_t_signal and enable_deepseek:
-                        # 使用 DeepSeek 做T信号（新版简化指令）
-                        report = deepseek_intraday_t_signal(
-                            code=code,
-                            position_cost=position_costs.get(code),
-                            position_ratio=position_ratios.get(code, 0.0),
-                        )
-                        signal_field = "操作指令"
-                        reason_field = "核心原因"
-                    else:
-                        # 使用标准规则策略信号
-                        report = intraday_trade_signal(code=code)
-                        signal_field = "信号"
-                        reason_field = "依据"
+                    if isinstance(result, BaseException):
+                        raise result
+                    report, signal_field, reason_field = result
 
                     # 检查是否是错误信息
-                    if (
-                        "分析过程中出错" in report
-                        or "未在 MySQL 中找到" in report
-                        or "未查询到东财行情数据" in report
-                    ):
-                        error_msg = f"[{now_bj.strftime('%Y-%m-%d %H:%M:%S')}] {code} 获取信号失败: {report}"
+                    if _REPORT_ERROR_RE.search(report):
+                        error_msg = f"[{now_str}] {code} 获取信号失败: {report}"
                         logger.error(error_msg)
                         if enable_feishu and FEISHU_ENABLED:
                             send_to_lark(error_msg, is_error=True)
                         continue
 
-                    signal = _extract_field(report, signal_field) or ""
-                    reason = _extract_field(report, reason_field) or ""
-                    rt_date = (
-                        _extract_field(report, "盘中日期")
-                        or _extract_field(report, "日期")
-                        or "未知"
-                    )
+                    fields = _parse_report(report)
+                    signal = fields.get(signal_field) or ""
 
                     # 判断是否需要打印
                     if print_all_signals:
@@ -182,131 +274,109 @@ def main() -> int:
                         if print_bias and signal in ("偏买入", "偏卖出"):
                             should_print = True
 
-                    # 只在"信号变化"时打印
-                    if should_print and last_printed.get(code) != signal:
-                        last_printed[code] = signal
-
-                        # 新版输出格式（简洁明确）
-                        if use_t_signal and enable_deepseek:
-                            # 根据信号类型选择 emoji
-                            if signal == "立即卖出":
-                                action_emoji = "🔴 卖出"
-                            elif signal == "立即买入":
-                                action_emoji = "🟢 买入"
-                            else:  # 暂不操作
-                                action_emoji = "⚪ 观望"
-
-                            exec_price = _extract_field(report, "执行价格") or "N/A"
-                            size = _extract_field(report, "建议数量") or "N/A"
-                            stop_loss = _extract_field(report, "止损价格") or "N/A"
-                            target = _extract_field(report, "目标价格") or "N/A"
-
-                            msg = (
-                                f"\n{'='*50}\n"
-                                f"⏰ {now_bj.strftime('%H:%M:%S')}  |  {code}\n"
-                                f"{'='*50}\n"
-                                f"{action_emoji}  【{signal}】\n"
-                                f"{'─'*50}\n"
-                                f"💰 执行价格: {exec_price}\n"
-                                f"📊 建议数量: {size}\n"
-                                f"🛡️ 止损价格: {stop_loss}\n"
-                                f"🎯 目标价格: {target}\n"
-                                f"{'─'*50}\n"
-                                f"💡 原因: {reason}\n"
-                                f"{'='*50}\n"
+                    # 只在"信号变化"时打印：不需要打印时直接跳过，不再取其它字段
+                    if not should_print or last_printed.get(code) == signal:
+                        continue
+
+                    last_printed[code] = signal
+                    reason = fields.get(reason_field) or ""
+                    rt_date = fields.get("盘中日期") or fields.get("日期") or "未知"
+
+                    # 新版输出格式（简洁明确）
+                    if use_t_signal and enable_deepseek:
+                        # 根据信号类型选择 emoji
+                        if signal == "立即卖出":
+                            action_emoji = "🔴 卖出"
+                        elif signal == "立即买入":
+                            action_emoji = "🟢 买入"
+                        else:  # 暂不操作
+                            action_emoji = "⚪ 观望"
+
+                        msg = _T_SIGNAL_MSG_TEMPLATE.format_map(
+                            {
+                                "time": now_str[11:],
+                                "code": code,
+                                "action": action_emoji,
+                                "signal": signal,
+                                "exec_price": fields.get("执行价格") or "N/A",
+                                "size": fields.get("建议数量") or "N/A",
+                                "stop_loss": fields.get("止损价格") or "N/A",
+                                "target": fields.get("目标价格") or "N/A",
+                                "reason": reason,
+                            }
+                        )
+                    else:
+                        # 标准策略保持原格式
+                        strategy_label = "规则策略"
+                        msg = (
+                            f"[{now_str}] "
+                            f"{code} {rt_date}\n【{strategy_label}】信号={signal}\n理由={reason}"
+                        )
+
+                    # 输出简洁信号到控制台
+                    logger.info(msg)
+
+                    # 如果启用了 AI 详细日志，将完整的 report（包含AI详细分析）记录到日志文件
+                    if log_ai_detail and use_t_signal and enable_deepseek:
+                        # 清理格式：一次正则替换去掉每行行首空白，以及 "- **" 前面的 "- "
+                        cleaned_report = _AI_REPORT_INDENT_RE.sub("", report)
+
+                        # 完整的 AI 分析报告（已格式化）只写入日志文件
+                        logger.info(
+                            "\n%s\n", cleaned_report, extra={"file_only": True}
+                        )
+
+                    # AI 辅助分析（仅在非做T模式下，或做T模式但未启用 DeepSeek 时）
+                    ai_msg = ""
+                    if enable_deepseek and not use_t_signal:
+                        try:
+                            logger.info(f"  -> 正在调用 DeepSeek AI 辅助分析...")
+                            ai_report = await asyncio.to_thread(
+                                deepseek_trade_signal, code=code
+                            )
+                            ai_fields = _parse_report(ai_report)
+                            ai_signal = (
+                                ai_fields.get("AI 信号") or "未知"
+                            )
+                            ai_reason = ai_fields.get("核心理由") or ""
+                            ai_stop_loss = (
+                                ai_fields.get("止损位") or "N/A"
                             )
-                        else:
-                            # 标准策略保持原格式
-                            strategy_label = "规则策略"
-                            msg = (
-                                f"[{now_bj.strftime('%Y-%m-%d %H:%M:%S')}] "
-                                f"{code} {rt_date}\n【{strategy_label}】信号={signal}\n理由={reason}"
+                            ai_target = ai_fields.get("目标位") or "N/A"
+
+                            ai_msg = (
+                                f"\n【DeepSeek AI】信号={ai_signal}\n"
+                                f"理由={ai_reason}\n"
+                                f"止损位={ai_stop_loss} | 目标位={ai_target}"
                             )
+                            logger.info(f"AI建议: {ai_msg}")
 
-                        # 输出简洁信号到控制台
-                        logger.info(msg)
-
-                        # 如果启用了 AI 详细日志，将完整的 report（包含AI详细分析）记录到日志文件
-                        if log_ai_detail and use_t_signal and enable_deepseek:
-                            # 清理格式：移除多余的缩进
-                            import logging
-                            import re
-
-                            # 移除每行开头的多余空格（保留相对缩进）
-                            lines = report.split("\n")
-                            cleaned_lines = []
-                            for line in lines:
-                                # 移除行首的多余空格，但保留相对缩进结构
-                                stripped = line.lstrip()
-                                # 如果是以 "- **" 开头的，去掉 "- "
-                                if stripped.startswith("- **"):
-                                    stripped = stripped[2:]
-                                cleaned_lines.append(stripped)
-
-                            cleaned_report = "\n".join(cleaned_lines)
-
-                            for handler in logger.handlers:
-                                if isinstance(handler, logging.FileHandler):
-                                    # 创建日志记录，记录格式化后的 report
-                                    record = logging.LogRecord(
-                                        name=logger.name,
-                                        level=logging.INFO,
-                                        pathname=__file__,
-                                        lineno=0,
-                                        msg=f"\n{cleaned_report}\n",  # 完整的 AI 分析报告（已格式化）
-                                        args=(),
-                                        exc_info=None,
-                                    )
-                                    handler.emit(record)
-
-                        # AI 辅助分析（仅在非做T模式下，或做T模式但未启用 DeepSeek 时）
-                        ai_msg = ""
-                        if enable_deepseek and not use_t_signal:
-                            try:
-                                logger.info(f"  -> 正在调用 DeepSeek AI 辅助分析...")
-                                ai_report = deepseek_trade_signal(code=code)
-                                ai_signal = (
-                                    _extract_field(ai_report, "AI 信号") or "未知"
+                            # 信号一致性检查
+                            if signal in ("买入", "卖出") and ai_signal == signal:
+                                consistency_msg = (
+                                    f"\n✅ 规则策略与 AI 信号一致！置信度更高"
                                 )
-                                ai_reason = _extract_field(ai_report, "核心理由") or ""
-                                ai_stop_loss = (
-                                    _extract_field(ai_report, "止损位") or "N/A"
+                                logger.info(consistency_msg)
+                                ai_msg += consistency_msg
+                            elif signal in ("买入", "卖出") and ai_signal != signal:
+                                conflict_msg = (
+                                    f"\n⚠️ 规则策略与 AI 信号不一致，建议谨慎决策"
                                 )
-                                ai_target = _extract_field(ai_report, "目标位") or "N/A"
+                                logger.warning(conflict_msg)
+                                ai_msg += conflict_msg
 
-                                ai_msg = (
-                                    f"\n【DeepSeek AI】信号={ai_signal}\n"
-                                    f"理由={ai_reason}\n"
-                                    f"止损位={ai_stop_loss} | 目标位={ai_target}"
-                                )
-                                logger.info(f"AI建议: {ai_msg}")
-
-                                # 信号一致性检查
-                                if signal in ("买入", "卖出") and ai_signal == signal:
-                                    consistency_msg = (
-                                        f"\n✅ 规则策略与 AI 信号一致！置信度更高"
-                                    )
-                                    logger.info(consistency_msg)
-                                    ai_msg += consistency_msg
-                                elif signal in ("买入", "卖出") and ai_signal != signal:
-                                    conflict_msg = (
-                                        f"\n⚠️ 规则策略与 AI 信号不一致，建议谨慎决策"
-                                    )
-                                    logger.warning(conflict_msg)
-                                    ai_msg += conflict_msg
-
-                            except Exception as e:
-                                ai_error = f"\n[DeepSeek AI 调用失败: {e}]"
-                                logger.error(ai_error)
-                                ai_msg = ai_error
-
-                        # 发送飞书通知（包含 AI 分析，如果有）
-                        if enable_feishu and FEISHU_ENABLED:
-                            full_msg = msg + ai_msg if ai_msg else msg
-                            send_to_lark(full_msg, is_error=False)
+                        except Exception as e:
+                            ai_error = f"\n[DeepSeek AI 调用失败: {e}]"
+                            logger.error(ai_error)
+                            ai_msg = ai_error
+
+                    # 发送飞书通知（包含 AI 分析，如果有）
+                    if enable_feishu and FEISHU_ENABLED:
+                        full_msg = msg + ai_msg if ai_msg else msg
+                        send_to_lark(full_msg, is_error=False)
 
                 except Exception as e:
-                    error_msg = f"[{now_bj.strftime('%Y-%m-%d %H:%M:%S')}] {code} 获取信号失败: {e}"
+                    error_msg = f"[{now_str}] {code} 获取信号失败: {e}"
                     logger.error(error_msg)
 
                     # 错误也发飞书（可选）
@@ -316,8 +386,17 @@ def main() -> int:
             # 非交易时段不打扰（你也可以删掉这行）
             pass
 
-        cost = time.time() - start
-        time.sleep(max(0.0, float(interval) - cost))
+        delay = next_tick - loop.time()
+        if delay < 0:
+            # 本轮超时：不补跑错过的轮次，从当前时间重新排期
+            logger.warning(f"本轮耗时超过轮询间隔 {interval}s，跳过错过的轮次")
+            next_tick = loop.time()
+            delay = 0.0
+        await asyncio.sleep(delay)
+
+
+def main() -> int:
+    return asyncio.run(_main_async())
 
 
 if __name__ == "__main__":
@@ -29,10 +29,14 @@
 
 from __future__ import annotations
 
+import functools
+import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from ingest_eastmoney_daily_to_mysql import (
     DEFAULT_MYSQL_URL,
@@ -50,9 +54,22 @@ from sqlalchemy import (
     Table,
     create_engine,
     func,
-    text,
 )
 from sqlalchemy.dialects.mysql import insert  # type: ignore
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from logger_config import setup_logging
+
+# 日志经 QueueHandler 入队，文件/控制台写入由后台线程完成，不阻塞轮询；main() 中完成配置
+logger = logging.getLogger("poll_snapshot")
+
+
+# 北京时区（模块加载时创建一次）；系统缺少时区数据库时退回固定 UTC+8
+try:
+    _BJ_TZ = ZoneInfo("Asia/Shanghai")
+except ZoneInfoNotFoundError:
+    _BJ_TZ = timezone(timedelta(hours=8))
 
 
 @dataclass(frozen=True)
@@ -110,32 +127,37 @@ def build_snapshot_table(metadata: MetaData) -> Table:
     )
 
 
+def _beijing_now() -> datetime:
+    """获取北京时间（不带时区信息，秒级精度，用于 update_time/create_time）。"""
+    return datetime.now(_BJ_TZ).replace(microsecond=0, tzinfo=None)
+
+
 def _beijing_now_minute() -> datetime:
     """获取北京时间并对齐到分钟（秒、微秒置 0）。"""
-    now_utc = datetime.now(timezone.utc)
-    bj = now_utc + timedelta(hours=8)
-    return bj.replace(second=0, microsecond=0, tzinfo=None)
+    return _beijing_now().replace(second=0)
 
 
-def _upsert_snapshot(conn, table: Table, code: str) -> None:
+def _fetch_snapshot(
+    code: str, bar_time: datetime, per_code_sleep_seconds: float
+) -> dict:
     """
-    拉取东财最新一根日线（盘中动态），并写入分钟快照表。
+    拉取东财最新一根日线（盘中动态），转换为分钟快照表的一行（在线程池中执行）。
     """
     code6 = normalize_code(code)
-    rows = fetch_eastmoney_kline_daily(code=code, limit=2)
+    try:
+        rows = fetch_eastmoney_kline_daily(code=code, limit=1)
+    finally:
+        # 请求后的礼貌等待只占用当前线程
+        time.sleep(max(0.0, float(per_code_sleep_seconds)))
     if not rows:
         raise ValueError("未拉到东财行情数据")
 
     latest = rows[-1]
-    bar_time = _beijing_now_minute()
 
     # 表字段 amount 注释为“千元”，东财一般返回“元”，这里换算
     amount_k = latest.amount / 1000 if latest.amount is not None else None
 
-    # 统一使用北京时间写入 update_time/create_time（不依赖 MySQL 时区表）
-    beijing_now_expr = text("DATE_ADD(UTC_TIMESTAMP(), INTERVAL 8 HOUR)")
-
-    values = {
+    return {
         "ts_code": code6,
         "bar_time": bar_time,
         "trade_date": latest.trade_date,
@@ -146,11 +168,17 @@ def _upsert_snapshot(conn, table: Table, code: str) -> None:
         "vol": int(latest.vol) if latest.vol is not None else None,
         "amount": amount_k,
         "pct_chg": latest.pct_chg,
-        "update_time": beijing_now_expr,
-        "create_time": beijing_now_expr,
     }
 
-    stmt = insert(table).values(values)
+
+def _upsert_snapshots(conn, table: Table, values: list[dict]) -> None:
+    """将本轮所有代码的快照合并为一条多行 INSERT ... ON DUPLICATE KEY UPDATE 写入。"""
+    # 统一使用北京时间写入 update_time/create_time（不依赖 MySQL 时区表）；
+    # 在 Python 侧算好作为参数绑定，多行 VALUES 里不用每行重复一次 DATE_ADD 表达式
+    beijing_now = _beijing_now()
+
+    rows = [{**v, "update_time": beijing_now, "create_time": beijing_now} for v in values]
+    stmt = insert(table).values(rows)
     stmt = stmt.on_duplicate_key_update(
         trade_date=stmt.inserted.trade_date,
         open=stmt.inserted.open,
@@ -160,28 +188,73 @@ def _upsert_snapshot(conn, table: Table, code: str) -> None:
         vol=stmt.inserted.vol,
         amount=stmt.inserted.amount,
         pct_chg=stmt.inserted.pct_chg,
-        update_time=beijing_now_expr,
+        update_time=stmt.inserted.update_time,
     )
     conn.execute(stmt)
 
-    print(
-        f"[OK] {code6} bar_time={bar_time} trade_date={latest.trade_date} close={latest.close}"
-    )
 
+@functools.lru_cache(maxsize=1)
+def _get_engine_and_table(mysql_url: str) -> tuple[Engine, Table]:
+    """
+    按连接串缓存 engine 与表定义（常驻轮询时每轮复用）。
 
-def _poll_once(cfg: PollConfig) -> None:
-    engine = create_engine(cfg.mysql_url, pool_pre_ping=True)
+    说明：
+    - 复用同一个连接池，避免每轮重新建连
+    - metadata.create_all 只在首次调用时执行一次（避免每轮都做建表检查）
+    - 不开 pool_pre_ping（每次取连接都会多一次 SELECT 1 往返）：改为定期回收连接，
+      偶发的断连由 _poll_once 里的重试兜底
+    """
+    engine = create_engine(
+        mysql_url, pool_recycle=1800, pool_size=4, max_overflow=4
+    )
     metadata = MetaData()
     table = build_snapshot_table(metadata)
     metadata.create_all(engine)
+    return engine, table
+
+
+def _poll_once(cfg: PollConfig) -> None:
+    engine, table = _get_engine_and_table(cfg.mysql_url)
+
+    bar_time = _beijing_now_minute()
+
+    # 行情拉取是网络 I/O：各代码并发请求；全部拉完后一次性批量入库
+    with ThreadPoolExecutor(max_workers=min(8, len(cfg.codes))) as executor:
+        futures = {
+            c: executor.submit(
+                _fetch_snapshot, c, bar_time, cfg.per_code_sleep_seconds
+            )
+            for c in cfg.codes
+        }
+
+    values: list[dict] = []
+    for c, fut in futures.items():
+        try:
+            values.append(fut.result())
+        except Exception as e:
+            logger.error(f"[FAIL] {c} -> {e}")
+
+    if not values:
+        return
+
+    try:
+        try:
+            with engine.begin() as conn:
+                _upsert_snapshots(conn, table, values)
+        except OperationalError as e:
+            # 连接已被 MySQL 断开（如 2006/2013）：SQLAlchemy 会作废池内连接，重连后重试一次
+            if not e.connection_invalidated:
+                raise
+            with engine.begin() as conn:
+                _upsert_snapshots(conn, table, values)
+    except Exception as e:
+        logger.error(f"[FAIL] 入库失败 -> {e}")
+        return
 
-    with engine.begin() as conn:
-        for c in cfg.codes:
-            try:
-                _upsert_snapshot(conn, table, c)
-            except Exception as e:
-                print(f"[FAIL] {c} -> {e}")
-            time.sleep(max(0.0, float(cfg.per_code_sleep_seconds)))
+    for v in values:
+        logger.info(
+            f"[OK] {v['ts_code']} bar_time={bar_time} trade_date={v['trade_date']} close={v['close']}"
+        )
 
 
 def main() -> int:
@@ -191,7 +264,7 @@ def main() -> int:
     MYSQL_URL = os.getenv("MYSQL_URL") or DEFAULT_MYSQL_URL
     CODES = ["159218", "159840"]  # 支持 '159840' / '159840.SZ' 等
     INTERVAL_SECONDS = 60.0  # 每轮间隔秒数（默认 60 秒）
-    PER_CODE_SLEEP_SECONDS = 0.2  # 每个 code 请求后的 sleep（默认 0.2 秒）
+    PER_CODE_SLEEP_SECONDS = 0.2  # 每个 code 请求后的 sleep（并发拉取时按线程计，默认 0.2 秒）
     ONCE = False  # True：只跑一轮就退出（适合 cron）；False：常驻轮询
 
     cfg = PollConfig(
@@ -201,16 +274,24 @@ def main() -> int:
         per_code_sleep_seconds=PER_CODE_SLEEP_SECONDS,
         once=ONCE,
     )
+    setup_logging(name="poll_snapshot")
     if cfg.once:
         _poll_once(cfg)
         return 0
 
-    print(f"开始轮询快照：codes={cfg.codes} interval={cfg.interval_seconds}s")
+    logger.info(f"开始轮询快照：codes={cfg.codes} interval={cfg.interval_seconds}s")
+    # 按绝对时间排期（单调时钟，不受系统校时影响）：每轮耗时不会累积成漂移
+    next_tick = time.monotonic()
     while True:
-        start = time.time()
         _poll_once(cfg)
-        cost = time.time() - start
-        time.sleep(max(0.0, cfg.interval_seconds - cost))
+        next_tick += cfg.interval_seconds
+        delay = next_tick - time.monotonic()
+        if delay < 0:
+            # 本轮超时：不补跑错过的轮次，从当前时间重新排期
+            logger.warning(f"[WARN] 本轮耗时超过轮询间隔 {cfg.interval_seconds}s，跳过错过的轮次")
+            next_tick = time.monotonic()
+            delay = 0.0
+        time.sleep(delay)
 
 
 if __name__ == "__main__":
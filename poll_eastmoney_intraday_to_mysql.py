@@ -26,19 +26,38 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from sqlalchemy import MetaData, create_engine, text
+from sqlalchemy import MetaData, Table, bindparam, create_engine, text
 from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 
+from eastmoney_client import infer_exch_code
 from ingest_eastmoney_daily_to_mysql import (
     DEFAULT_MYSQL_URL,
     KlineDailyRow,
     build_table,
     fetch_eastmoney_kline_daily,
 )
+from logger_config import setup_logging
+
+# 日志经 QueueHandler 入队，文件/控制台写入由后台线程完成，不阻塞轮询；main() 中完成配置
+logger = logging.getLogger("poll_intraday")
+
+
+# 北京时区（模块加载时创建一次）；系统缺少时区数据库时退回固定 UTC+8
+try:
+    _BJ_TZ = ZoneInfo("Asia/Shanghai")
+except ZoneInfoNotFoundError:
+    _BJ_TZ = timezone(timedelta(hours=8))
 
 
 @dataclass(frozen=True)
@@ -50,86 +69,103 @@ class PollConfig:
     once: bool
 
 
-def _infer_exch_code(code6: str) -> str:
-    """根据 6 位代码推断交易所代码（仅用于落库标识）。"""
-    # 沪市（与 get_secid / tushare_mcp.py 的判断保持一致）
-    if code6.startswith(("60", "688", "50", "51", "56", "58")):
-        return "SH"
-    # 北交所
-    if code6.startswith("8"):
-        return "BJ"
-    # 其它默认深市（含深市 ETF 159xxx）
-    return "SZ"
+def _beijing_now() -> datetime:
+    """获取北京时间（不带时区信息，秒级精度，用于 update_time/create_time）。"""
+    return datetime.now(_BJ_TZ).replace(microsecond=0, tzinfo=None)
+
+
+_PREV_CLOSE_SQL = text(
+    """
+    SELECT d.ts_code, d.close
+    FROM stock_daily d
+    JOIN (
+        SELECT ts_code, MAX(trade_date) AS trade_date
+        FROM stock_daily
+        WHERE ts_code IN :codes
+          AND trade_date < :trade_date
+        GROUP BY ts_code
+    ) p ON d.ts_code = p.ts_code AND d.trade_date = p.trade_date
+    """
+).bindparams(bindparam("codes", expanding=True))
 
 
-def _get_prev_close(conn, code6: str, trade_date: str) -> float | None:
+def _get_prev_closes(conn, code6s: list[str], trade_date: str) -> dict[str, float]:
     """
-    查询指定标的在 trade_date 之前最近一个交易日的 close。
+    一次查询多个标的在 trade_date 之前最近一个交易日的 close，返回 {code6: close}。
 
     说明：
     - trade_date 为 'YYYY-MM-DD'
     - 用于推导 pre_close / change_amount / pct_chg（若东财未返回 pct_chg）
+    - 查不到历史的代码不会出现在返回结果里
     """
-    sql = text(
-        """
-        SELECT close
-        FROM stock_daily
-        WHERE ts_code = :code
-          AND trade_date < :trade_date
-        ORDER BY trade_date DESC
-        LIMIT 1
-        """
-    )
-    row = conn.execute(sql, {"code": code6, "trade_date": trade_date}).fetchone()
-    if not row:
-        return None
-    try:
-        return float(row[0])
-    except Exception:
-        return None
-
-
-def _upsert_intraday_row(conn, table, kline: KlineDailyRow) -> None:
+    result: dict[str, float] = {}
+    for code6, close in conn.execute(
+        _PREV_CLOSE_SQL, {"codes": code6s, "trade_date": trade_date}
+    ):
+        try:
+            result[code6] = float(close)
+        except Exception:
+            continue
+    return result
+
+
+def _upsert_intraday_rows(conn, table, klines: list[KlineDailyRow]) -> None:
     """
-    将“盘中最新一根日线”写入 stock_daily（主键冲突则更新）。
+    将各标的“盘中最新一根日线”一次性写入 stock_daily（主键冲突则更新）。
 
     设计：
     - 同一天会不断更新 close/high/low/vol/amount/pct_chg 等字段
-    - pre_close 来自 MySQL 历史最近一日收盘（如果能查到）
+    - 东财同时返回涨跌幅和涨跌额时，pre_close = close - 涨跌额，不查库
+    - 缺任一字段的代码才回退到 MySQL 历史最近一日收盘；按交易日分组批量查询，通常只有一组
+    - 所有代码合并为一条多行 INSERT ... ON DUPLICATE KEY UPDATE
     """
-    exch_code = _infer_exch_code(kline.code)
-    pre_close = _get_prev_close(conn, code6=kline.code, trade_date=kline.trade_date)
-
-    change_amount = None
-    pct_chg = kline.pct_chg
-    if pre_close is not None:
-        change_amount = kline.close - pre_close
-        # 优先使用东财 pct_chg；没有则用 pre_close 推导
-        if pct_chg is None and pre_close != 0:
-            pct_chg = (kline.close - pre_close) / pre_close * 100
-
-    # 表字段 amount 注释为“千元”，东财一般返回“元”，这里做单位换算
-    amount_k = kline.amount / 1000 if kline.amount is not None else None
-
-    # 统一使用北京时间写入 update_time/create_time（不依赖 MySQL 时区表）
-    beijing_now = text("DATE_ADD(UTC_TIMESTAMP(), INTERVAL 8 HOUR)")
-
-    values = {
-        "ts_code": kline.code,
-        "exch_code": exch_code,
-        "trade_date": kline.trade_date,
-        "open": kline.open,
-        "high": kline.high,
-        "low": kline.low,
-        "close": kline.close,
-        "pre_close": pre_close,
-        "change_amount": change_amount,
-        "pct_chg": pct_chg,
-        "vol": int(kline.vol) if kline.vol is not None else None,
-        "amount": amount_k,
-        "update_time": beijing_now,
-        "create_time": beijing_now,
-    }
+    missing = [k for k in klines if k.pct_chg is None or k.change_amount is None]
+    prev_closes: dict[tuple[str, str], float] = {}
+    for trade_date in {k.trade_date for k in missing}:
+        code6s = [k.code for k in missing if k.trade_date == trade_date]
+        for code6, close in _get_prev_closes(conn, code6s, trade_date).items():
+            prev_closes[(code6, trade_date)] = close
+
+    # 统一使用北京时间写入 update_time/create_time（不依赖 MySQL 时区表）；
+    # 在 Python 侧算好作为参数绑定，多行 VALUES 里不用每行重复一次 DATE_ADD 表达式
+    beijing_now = _beijing_now()
+
+    values = []
+    for kline in klines:
+        pct_chg = kline.pct_chg
+        change_amount = kline.change_amount
+        if pct_chg is not None and change_amount is not None:
+            # 东财价格最多 3 位小数，round 去掉浮点减法的尾差
+            pre_close = round(kline.close - change_amount, 4)
+        else:
+            pre_close = prev_closes.get((kline.code, kline.trade_date))
+            if pre_close is not None:
+                change_amount = kline.close - pre_close
+                # 优先使用东财 pct_chg；没有则用 pre_close 推导
+                if pct_chg is None and pre_close != 0:
+                    pct_chg = (kline.close - pre_close) / pre_close * 100
+
+        # 表字段 amount 注释为“千元”，东财一般返回“元”，这里做单位换算
+        amount_k = kline.amount / 1000 if kline.amount is not None else None
+
+        values.append(
+            {
+                "ts_code": kline.code,
+                "exch_code": infer_exch_code(kline.code),
+                "trade_date": kline.trade_date,
+                "open": kline.open,
+                "high": kline.high,
+                "low": kline.low,
+                "close": kline.close,
+                "pre_close": pre_close,
+                "change_amount": change_amount,
+                "pct_chg": pct_chg,
+                "vol": int(kline.vol) if kline.vol is not None else None,
+                "amount": amount_k,
+                "update_time": beijing_now,
+                "create_time": beijing_now,
+            }
+        )
 
     stmt = insert(table).values(values)
     stmt = stmt.on_duplicate_key_update(
@@ -143,33 +179,83 @@ def _upsert_intraday_row(conn, table, kline: KlineDailyRow) -> None:
         pct_chg=stmt.inserted.pct_chg,
         vol=stmt.inserted.vol,
         amount=stmt.inserted.amount,
-        update_time=beijing_now,
+        update_time=stmt.inserted.update_time,
     )
     conn.execute(stmt)
 
 
-def _poll_once(cfg: PollConfig) -> None:
-    engine = create_engine(cfg.mysql_url, pool_pre_ping=True)
+def _fetch_latest(code: str, per_code_sleep_seconds: float) -> KlineDailyRow | None:
+    """拉取单个代码最新一根日线（在线程池中执行）；请求后的礼貌等待只占用当前线程。"""
+    try:
+        rows = fetch_eastmoney_kline_daily(code=code, limit=1)
+    finally:
+        time.sleep(max(0.0, float(per_code_sleep_seconds)))
+    return rows[-1] if rows else None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_engine_and_table(mysql_url: str) -> tuple[Engine, Table]:
+    """
+    按连接串缓存 engine 与表定义（常驻轮询时每轮复用）。
+
+    说明：
+    - 复用同一个连接池，避免每轮重新建连
+    - metadata.create_all 只在首次调用时执行一次（避免每轮都做建表检查）
+    - 不开 pool_pre_ping（每次取连接都会多一次 SELECT 1 往返）：改为定期回收连接，
+      偶发的断连由 _poll_once 里的重试兜底
+    """
+    engine = create_engine(
+        mysql_url, pool_recycle=1800, pool_size=4, max_overflow=4
+    )
     metadata = MetaData()
     table = build_table(metadata)
     metadata.create_all(engine)
+    return engine, table
 
-    with engine.begin() as conn:
-        for code in cfg.codes:
-            try:
-                rows = fetch_eastmoney_kline_daily(code=code, limit=2)
-                if not rows:
-                    print(f"[WARN] {code} 未拉到行情数据")
-                    continue
 
-                latest = rows[-1]
-                _upsert_intraday_row(conn, table, latest)
-                print(
-                    f"[OK] {code} {latest.trade_date} close={latest.close} high={latest.high} low={latest.low}"
-                )
-            except Exception as e:
-                print(f"[FAIL] {code} -> {e}")
-            time.sleep(max(0.0, float(cfg.per_code_sleep_seconds)))
+def _poll_once(cfg: PollConfig) -> None:
+    engine, table = _get_engine_and_table(cfg.mysql_url)
+
+    # 行情拉取是网络 I/O：各代码并发请求；全部拉完后一次性批量入库
+    with ThreadPoolExecutor(max_workers=min(8, len(cfg.codes))) as executor:
+        futures = {
+            code: executor.submit(_fetch_latest, code, cfg.per_code_sleep_seconds)
+            for code in cfg.codes
+        }
+
+    latest_rows: list[KlineDailyRow] = []
+    for code, fut in futures.items():
+        try:
+            latest = fut.result()
+        except Exception as e:
+            logger.error(f"[FAIL] {code} -> {e}")
+            continue
+        if latest is None:
+            logger.warning(f"[WARN] {code} 未拉到行情数据")
+            continue
+        latest_rows.append(latest)
+
+    if not latest_rows:
+        return
+
+    try:
+        try:
+            with engine.begin() as conn:
+                _upsert_intraday_rows(conn, table, latest_rows)
+        except OperationalError as e:
+            # 连接已被 MySQL 断开（如 2006/2013）：SQLAlchemy 会作废池内连接，重连后重试一次
+            if not e.connection_invalidated:
+                raise
+            with engine.begin() as conn:
+                _upsert_intraday_rows(conn, table, latest_rows)
+    except Exception as e:
+        logger.error(f"[FAIL] 入库失败 -> {e}")
+        return
+
+    for latest in latest_rows:
+        logger.info(
+            f"[OK] {latest.code} {latest.trade_date} close={latest.close} high={latest.high} low={latest.low}"
+        )
 
 
 def _parse_args() -> PollConfig:
@@ -196,7 +282,7 @@ def _parse_args() -> PollConfig:
         "--per-code-sleep",
         type=float,
         default=float(os.getenv("PER_CODE_SLEEP_SECONDS") or 0.2),
-        help="每个 code 请求后的 sleep（避免过于频繁，默认 0.2 秒）",
+        help="每个 code 请求后的 sleep（并发拉取时按线程计，避免过于频繁，默认 0.2 秒）",
     )
     parser.add_argument(
         "--once",
@@ -220,19 +306,26 @@ def _parse_args() -> PollConfig:
 
 def main() -> int:
     cfg = _parse_args()
+    setup_logging(name="poll_intraday")
     if cfg.once:
         _poll_once(cfg)
         return 0
 
-    print(
+    logger.info(
         f"开始轮询：codes={cfg.codes} interval={cfg.interval_seconds}s mysql_url={'已配置' if cfg.mysql_url else '未配置'}"
     )
+    # 按绝对时间排期（单调时钟，不受系统校时影响）：每轮耗时不会累积成漂移
+    next_tick = time.monotonic()
     while True:
-        start = time.time()
         _poll_once(cfg)
-        cost = time.time() - start
-        sleep_s = max(0.0, cfg.interval_seconds - cost)
-        time.sleep(sleep_s)
+        next_tick += cfg.interval_seconds
+        delay = next_tick - time.monotonic()
+        if delay < 0:
+            # 本轮超时：不补跑错过的轮次，从当前时间重新排期
+            logger.warning(f"[WARN] 本轮耗时超过轮询间隔 {cfg.interval_seconds}s，跳过错过的轮次")
+            next_tick = time.monotonic()
+            delay = 0.0
+        time.sleep(delay)
 
 
 if __name__ == "__main__":
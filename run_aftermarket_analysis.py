@@ -9,6 +9,7 @@
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -42,6 +43,19 @@ POSITION_RATIOS = {
 ENABLE_FEISHU = False
 
 
+def _analyze_one(code: str) -> tuple[str, bool]:
+    """对单个标的执行盘后分析，返回 (报告或错误信息, 是否成功)。"""
+    try:
+        report = deepseek_aftermarket_analysis(
+            code=code,
+            position_cost=POSITION_COSTS.get(code),
+            position_ratio=POSITION_RATIOS.get(code, 0.0),
+        )
+        return report, True
+    except Exception as e:
+        return f"❌ {code} 盘后分析失败: {e}", False
+
+
 def main():
     """执行盘后分析"""
     # 初始化日志
@@ -54,28 +68,21 @@ def main():
     logger.info("=" * 60)
     logger.info("🌙 开始执行盘后分析...")
     logger.info("=" * 60)
+    logger.info(f"\n正在并发分析 {', '.join(CODES)}...")
 
-    results = []
-
-    for code in CODES:
-        logger.info(f"\n正在分析 {code}...")
-
-        try:
-            # 执行盘后分析
-            report = deepseek_aftermarket_analysis(
-                code=code,
-                position_cost=POSITION_COSTS.get(code),
-                position_ratio=POSITION_RATIOS.get(code, 0.0),
-            )
+    # 各标的的 DeepSeek 请求互不依赖，并发执行，总耗时约等于最慢的一个；
+    # 全部完成后再按 CODES 顺序输出，报告不会交错
+    with ThreadPoolExecutor(max_workers=len(CODES)) as executor:
+        outcomes = list(executor.map(_analyze_one, CODES))
 
+    results = []
+    for text, ok in outcomes:
+        if ok:
             # 打印到控制台和日志
-            logger.info(f"\n{report}")
-            results.append(report)
-
-        except Exception as e:
-            error_msg = f"❌ {code} 盘后分析失败: {e}"
-            logger.error(error_msg)
-            results.append(error_msg)
+            logger.info(f"\n{text}")
+        else:
+            logger.error(text)
+        results.append(text)
 
     # 发送飞书通知（合并所有结果）
     if ENABLE_FEISHU:
@@ -3,30 +3,45 @@
 快速测试当前AI操作指令
 """
 
+import asyncio
+
 from tushare_mcp import deepseek_intraday_t_signal
 
-if __name__ == "__main__":
-    # 配置参数
-    codes = {
-        "159218": {"cost": 1.55, "ratio": 0.5},  # 持仓成本1.55，仓位50%
-        "159840": {"cost": None, "ratio": 0.0},  # 空仓
-    }
+# 配置参数
+CODES = {
+    "159218": {"cost": 1.55, "ratio": 0.5},  # 持仓成本1.55，仓位50%
+    "159840": {"cost": None, "ratio": 0.0},  # 空仓
+}
+
 
+async def _run() -> None:
     print("\n" + "="*60)
     print("📊 AI 操作指令实时查询")
     print("="*60 + "\n")
 
-    for code, position in codes.items():
-        try:
-            report = deepseek_intraday_t_signal(
+    # 各标的并发查询，全部完成后按顺序打印
+    reports = await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                deepseek_intraday_t_signal,
                 code=code,
                 position_cost=position["cost"],
                 position_ratio=position["ratio"],
             )
+            for code, position in CODES.items()
+        ),
+        return_exceptions=True,
+    )
+
+    for code, report in zip(CODES, reports):
+        if isinstance(report, Exception):
+            print(f"❌ {code} 查询失败: {report}\n")
+        else:
             print(report)
             print()
-        except Exception as e:
-            print(f"❌ {code} 查询失败: {e}\n")
 
     print("="*60)
 
+
+if __name__ == "__main__":
+    asyncio.run(_run())
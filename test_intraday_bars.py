@@ -3,8 +3,13 @@
 测试分钟线数据是否被正确读取并传给 AI
 """
 
+import re
+
 from tushare_mcp import deepseek_intraday_t_signal
 
+# 报告中代表"已使用分钟线数据"的关键词（一个正则一次扫描）
+_BAR_MARKER_RE = re.compile("分钟线|日内走势")
+
 print("="*60)
 print("测试 AI 分析是否包含分钟线数据")
 print("="*60)
@@ -21,7 +26,7 @@ try:
     )
     
     # 检查报告中是否包含分钟线相关的内容
-    if "分钟线" in report or "日内走势" in report:
+    if _BAR_MARKER_RE.search(report):
         print("✓ AI 分析已包含分钟线数据")
     else:
         print("⚠️  AI 分析可能未充分利用分钟线数据")
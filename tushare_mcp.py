@@ -1,11 +1,14 @@
+import asyncio
 import datetime
-import json
+import functools
 import os
 import re
+import threading
 import time
-import urllib.parse
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
 
 # 加载 .env 文件（如果存在）
 try:
@@ -17,57 +20,97 @@ try:
 except ImportError:
     pass  # python-dotenv 未安装，跳过
 
+import numpy as np
 import pandas as pd
 import tushare as ts
 from mcp.server.fastmcp import FastMCP
 
+from eastmoney_client import DAILY_KLINE_PARAMS as EASTMONEY_DAILY_KLINE_PARAMS
+from eastmoney_client import fetch_kline_payload as fetch_eastmoney_kline_payload
+from eastmoney_client import get_secid as _get_eastmoney_secid
+from eastmoney_client import normalize_code as _normalize_code
+from file_cache import DEFAULT_CACHE_DIR, FileCache
+
+# orjson 可选：安装了就用（C 实现，更快），否则回退标准库 json
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 # 初始化 MCP Server
 mcp = FastMCP("TushareStockAdvisor")
 
-# 初始化 Tushare API (需从 tushare.pro 获取 Token)
-# 建议通过环境变量设置 TUSHARE_TOKEN
-TUSHARE_TOKEN = os.getenv("TUSHARE_TOKEN")
-if TUSHARE_TOKEN:
-    ts.set_token(TUSHARE_TOKEN)
-    pro = ts.pro_api()
-else:
-    pro = None
-
 
-def _normalize_code(code: str) -> str:
+def _threaded_tool(fn):
     """
-    规范化证券代码（用于东财接口）。
+    把同步函数注册为 MCP 工具，但放到线程里执行。
 
     说明：
-    - 支持 '159218' / '159218.SZ' / '159218.sz' 等形式
-    - 只保留数字并取前 6 位
+    - FastMCP 对同步工具是在事件循环里直接调用的，一个工具在等 MySQL/东财/DeepSeek 时其它请求全被卡住；
+      这里注册的是 async 包装，用 asyncio.to_thread 执行，多个工具调用可以同时进行
+    - 返回原函数本身，模块内/脚本里照常同步调用
     """
-    s = str(code).strip()
-    digits = re.sub(r"\D", "", s)
-    if len(digits) < 6:
-        raise ValueError(f"无法解析证券代码: {code}")
-    return digits[:6]
+
+    @functools.wraps(fn)
+    async def runner(*args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    mcp.tool()(runner)
+    return fn
 
 
-def _get_eastmoney_secid(code: str) -> str:
+async def _run_per_code(fn, codes: str, concurrency: int, **kwargs) -> str:
     """
-    根据证券代码推断东财 secid（市场前缀.代码）。
+    批量工具的公共实现：对逗号分隔的每个代码并发调用同步分析函数 fn(code, **kwargs)。
 
     说明：
-    - 深市：0.xxxxxx（含深市股票、深市 ETF 如 159xxx、北交所 8xxxxx）
-    - 沪市：1.xxxxxx（含沪市股票、沪市 ETF 如 510xxx/588xxx 等）
+    - 每只放到线程里跑，同时在途的不超过 concurrency；总耗时约等于最慢的一只，而不是逐只累加
+    - 报告按传入顺序拼接；各分析函数自己把异常转成提示文字，单只出错不影响其它
     """
-    code6 = _normalize_code(code)
+    code_list = [c.strip() for c in codes.split(",") if c.strip()]
+    if not code_list:
+        return "错误：未提供证券代码。"
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _analyze(code: str) -> str:
+        async with sem:
+            return await asyncio.to_thread(fn, code, **kwargs)
+
+    reports = await asyncio.gather(*(_analyze(c) for c in code_list))
+    return "\n".join(reports)
+
+# 初始化 Tushare API (需从 tushare.pro 获取 Token)
+# 建议通过环境变量设置 TUSHARE_TOKEN
+TUSHARE_TOKEN = os.getenv("TUSHARE_TOKEN")
+if TUSHARE_TOKEN:
+    ts.set_token(TUSHARE_TOKEN)
+    pro = ts.pro_api()
+else:
+    pro = None
 
-    # 深市：主板/中小板/创业板/ETF(159xxx 等)/北交所(8xxxxx)
-    if code6.startswith(("00", "30", "301", "002", "15", "16", "18", "8")):
-        return f"0.{code6}"
+# 东财日线的进程内短时缓存：(secid, limit) -> (过期时间 monotonic, rows)
+# 同一轮里多个工具（规则信号 + AI 信号）查同一标的时共用一次请求；TTL 短于盘中轮询间隔，不会读到上一轮的旧数据
+EASTMONEY_CACHE_TTL = 30.0
+_EASTMONEY_CACHE: dict[tuple[str, int], tuple[float, list[list[str]]]] = {}
+_EASTMONEY_CACHE_LOCK = threading.Lock()
 
-    # 沪市：主板/科创板/ETF(510xxx/588xxx/56xxxx 等)
-    if code6.startswith(("60", "688", "50", "51", "56", "58")):
-        return f"1.{code6}"
+# MySQL 历史收盘的进程内缓存：(code6, limit, url) -> (过期时间 monotonic, df)
+# 历史日线只在收盘后入库时变化；盘中当天那一行即使被轮询脚本更新，也会被实时价覆盖，缓存久一些无妨
+MYSQL_HISTORY_CACHE_TTL = 600.0
+_MYSQL_HISTORY_CACHE: dict[tuple[str, int, str], tuple[float, pd.DataFrame]] = {}
+_MYSQL_HISTORY_CACHE_LOCK = threading.Lock()
 
-    raise ValueError(f"无法识别证券代码的市场类型: {code}")
+
+def _eastmoney_cache_invalidate(code: str | None = None) -> None:
+    """清除东财日线缓存：传 code 只清该标的，不传则全部清空。"""
+    with _EASTMONEY_CACHE_LOCK:
+        if code is None:
+            _EASTMONEY_CACHE.clear()
+            return
+        secid = _get_eastmoney_secid(code)
+        for key in [k for k in _EASTMONEY_CACHE if k[0] == secid]:
+            del _EASTMONEY_CACHE[key]
 
 
 def _eastmoney_fetch_kline_daily(code: str, limit: int = 120) -> list[list[str]]:
@@ -77,92 +120,357 @@ def _eastmoney_fetch_kline_daily(code: str, limit: int = 120) -> list[list[str]]
     返回格式：
     - 每一行是拆分后的字段数组（字符串），第 0 位为 'YYYY-MM-DD'
     - 常见字段：日期, 今开, 收盘/当前, 最高, 最低, 成交量, 成交额, ... , 换手率(第 10 位)
+
+    说明：
+    - 结果按 (secid, limit) 缓存 EASTMONEY_CACHE_TTL 秒；返回的列表与缓存共享，调用方只读不改
     """
     secid = _get_eastmoney_secid(code)
-    url = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
-    params = {
-        # cb 为 JSONP 包装名，任意字符串即可
-        "cb": f"jQuery3510_{int(time.time() * 1000)}",
+    cache_key = (secid, int(limit))
+    with _EASTMONEY_CACHE_LOCK:
+        cached = _EASTMONEY_CACHE.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    # 不带 cb 参数：东财直接返回 JSON，不用再从 JSONP 包装里剥离；固定参数在模块级复用
+    params = EASTMONEY_DAILY_KLINE_PARAMS | {
         "secid": secid,
-        "ut": "fa5fd1943c7b386f172d6893dbfba10b",
-        "fields1": "f1,f2,f3,f4,f5,f6",
-        "fields2": "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61",
-        "klt": "101",  # 日线
-        "fqt": "1",  # 前复权
-        "end": "20500101",
         "lmt": str(limit),
         "_": str(int(time.time() * 1000)),
     }
 
-    req = urllib.request.Request(
-        url + "?" + urllib.parse.urlencode(params),
-        headers={
-            "User-Agent": (
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/136.0.0.0 Safari/537.36"
-            ),
-            "Host": "push2his.eastmoney.com",
-        },
-        method="GET",
-    )
-
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        text = resp.read().decode("utf-8", errors="replace")
-
-    # 注意：这里是解析 JSONP 包装，正则不需要写成双反斜杠
-    match = re.search(r"jQuery\d+_\d+\((.*)\);?", text)
-    if not match:
-        raise ValueError("无法解析东财 JSONP 响应")
-
-    payload = json.loads(match.group(1))
+    # 共享 keep-alive Session（eastmoney_client），省掉每次请求的 TCP/TLS 握手；
+    # parse_payload 直接解析 JSON（装了 orjson 时用 orjson），兼容仍返回 JSONP 的情况
+    payload = fetch_eastmoney_kline_payload(params, timeout=15)
     if not payload or "data" not in payload or "klines" not in payload["data"]:
         raise ValueError("东财行情数据缺失")
 
     klines = payload["data"]["klines"] or []
-    return [line.split(",") for line in klines]
+    rows = [line.split(",") for line in klines]
+    with _EASTMONEY_CACHE_LOCK:
+        _EASTMONEY_CACHE[cache_key] = (time.monotonic() + EASTMONEY_CACHE_TTL, rows)
+    return rows
 
 
-def _mysql_load_close_history(
-    code6: str, limit: int = 120, mysql_url: str | None = None
+def _rolling_means(close: pd.Series, *windows: int) -> tuple[np.ndarray, ...]:
+    """
+    一次算出多个窗口的简单移动平均（如 MA5 + MA20），按 windows 顺序返回。
+
+    说明：
+    - 每个结果等价于 close.rolling(w).mean()，前 w-1 个为 NaN
+    - 用一条 cumsum 前缀和的差分算出全部窗口均值，各窗口共用，收盘序列只转换、遍历一次
+    - 序列里有 NaN 时 cumsum 会把 NaN 传到后面所有位置，此时退回 rolling 保持原语义
+    - 历史不足 w 行（如新上市标的）时该窗口直接给全 NaN，不再走一遍 rolling
+    """
+    values = close.to_numpy(dtype=np.float64)
+    n = values.shape[0]
+    if np.isnan(values).any():
+        s = close.astype("float64")
+        return tuple(
+            s.rolling(w).mean().to_numpy() if n >= w else np.full(n, np.nan)
+            for w in windows
+        )
+    csum = np.empty(n + 1)
+    csum[0] = 0.0
+    np.cumsum(values, out=csum[1:])
+    outs = []
+    for w in windows:
+        out = np.full(n, np.nan)
+        if n >= w:
+            out[w - 1 :] = (csum[w:] - csum[:-w]) / w
+        outs.append(out)
+    return tuple(outs)
+
+
+def _window_mean(values: np.ndarray, end: int, window: int) -> float:
+    """
+    values[end-window:end] 的均值（即 rolling(window).mean() 在 end-1 处的值）。
+
+    说明：
+    - 信号只看最新/前一根的均线，直接对小切片求均值，不必算整条均线序列
+    - 数据不足 window 个时返回 NaN（与 rolling 一致）
+    """
+    if end < window:
+        return float("nan")
+    return float(values[end - window : end].mean())
+
+
+def _tail_with_ma(df: pd.DataFrame, n: int) -> pd.DataFrame:
+    """取最近 n 行并补上 ma5/ma20 列（只在这 n 行 + 19 行预热窗口上计算，供 prompt 展示）。"""
+    window = df.tail(n + 19)
+    ma5, ma20 = _rolling_means(window["close"], 5, 20)
+    return window.tail(n).assign(ma5=ma5[-n:], ma20=ma20[-n:])
+
+
+def _merge_realtime_close(
+    hist: pd.DataFrame, rt_date: str, rt_close: float
 ) -> pd.DataFrame:
     """
-    从 MySQL 的 stock_daily 表读取历史收盘价（用于盘中分析基线）。
+    把盘中最新价并入历史收盘序列：同日已存在则替换 close，否则追加一天。
 
     说明：
-    - 表结构来自 create_stock_daily_table.sql
-    - 默认使用环境变量 MYSQL_URL；也可显式传 mysql_url
-    - 返回字段：trade_date（datetime64）、close（float）
+    - 直接在 datetime64 数组上比较日期，不再逐行 strftime 成字符串
+    - hist 需按日期升序（_mysql_load_close_history 在 SQL 里排好）；返回的序列同样保持升序
+    - 返回新的 trade_date/close 两列 DataFrame，不修改传入的 hist
+    """
+    dates = hist["trade_date"].to_numpy()
+    closes = hist["close"].to_numpy(dtype=np.float64, copy=True)
+    rt_ts = np.datetime64(rt_date)
+    mask = dates == rt_ts
+    if mask.any():
+        closes[mask] = rt_close
+    else:
+        # 正常情况盘中日期晚于全部历史，直接追加到末尾；否则按日期插入，保持升序
+        pos = len(dates)
+        if pos and rt_ts < dates[-1]:
+            pos = int(np.searchsorted(dates, rt_ts))
+        dates = np.insert(dates, pos, rt_ts)
+        closes = np.insert(closes, pos, rt_close)
+    return pd.DataFrame({"trade_date": dates, "close": closes})
+
+
+@dataclass(frozen=True)
+class _IntradayBase:
+    """盘中分析的公共输入：并入盘中价后的收盘序列 + 最新/前一根均线 + 最新一根行情。"""
+
+    df: pd.DataFrame  # trade_date / close，按日期升序（只读，勿原地修改；展示用均线见 _tail_with_ma）
+    rt_date: str  # YYYY-MM-DD
+    rt_open: float
+    rt_close: float  # 盘中"当前/收盘"
+    rt_high: float
+    rt_low: float
+    rt_vol: float
+    rt_amount: float
+    ma5: float
+    ma20: float
+    prev_ma5: float
+    prev_ma20: float
+    y_close: float  # 昨收（历史上一条 close）
+    pct_chg: float | None
+
+
+# 盘中工具的后台 I/O 线程池（东财请求与查库并行）
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tushare_mcp_io")
+
+# _prepare_intraday_base 的短时缓存：(code6, mysql_url) -> (过期时间 monotonic, _IntradayBase)
+_INTRADAY_BASE_CACHE: dict[tuple[str, str | None], tuple[float, _IntradayBase]] = {}
+_INTRADAY_BASE_CACHE_LOCK = threading.Lock()
+
+
+def _prepare_intraday_base(
+    code: str, mysql_url: str | None = None
+) -> _IntradayBase | str:
     """
+    读 MySQL 历史收盘 + 东财盘中最新一根，并入后计算最新/前一根的 MA5/MA20（盘中各工具的公共前置步骤）。
+
+    说明：
+    - 数据不可用时返回给用户看的提示字符串（各工具直接原样返回）
+    - 成功结果按 (code6, mysql_url) 缓存 EASTMONEY_CACHE_TTL 秒：同一轮里规则信号和 AI 信号
+      查同一标的时，只查一次库、只算一次均线
+    """
+    code6 = _normalize_code(code)
+    cache_key = (code6, mysql_url)
+    with _INTRADAY_BASE_CACHE_LOCK:
+        cached = _INTRADAY_BASE_CACHE.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    # 未配置 MySQL 时直接报错，不发东财请求
     url = mysql_url or os.getenv("MYSQL_URL")
     if not url:
         raise ValueError("未配置 MYSQL_URL，无法从 MySQL 读取历史数据。")
 
+    # 东财请求与 MySQL 查询互不依赖：东财放到后台线程，与查库同时进行，耗时取两者较大值
+    rows_future = _IO_EXECUTOR.submit(_eastmoney_fetch_kline_daily, code=code, limit=120)
+    hist = None
+    try:
+        hist = _mysql_load_close_history(code6=code6, limit=200, mysql_url=url)
+    finally:
+        if hist is None or hist.empty:
+            # 查库失败/无历史时东财结果用不上：还没开始就取消，已在请求就等它结束（异常在此吸收），
+            # 不留无人接收结果的后台请求
+            if not rows_future.cancel():
+                rows_future.exception()
+    if hist.empty:
+        return f"未在 MySQL 中找到 {code6} 的历史数据，请先入库后再分析。"
+
+    # 东财最新一根（日线级，盘中动态）
+    rows = rows_future.result()
+    if not rows:
+        return "未查询到东财行情数据，请检查证券代码。"
+    latest = rows[-1]
+    if len(latest) < 7:
+        return "东财行情数据解析失败，请稍后重试。"
+
+    rt_date = latest[0]
+    rt_close = float(latest[2])
+
+    # 用实时价替换同日 close；否则 append 一天
+    df = _merge_realtime_close(hist, rt_date, rt_close)
+    if len(df) < 20:
+        return f"历史数据量不足（仅 {len(df)} 条），无法计算 MA20。"
+
+    # 只需要最新/前一根的 MA5/MA20：四次小切片求均值，不生成整列均线
+    close = df["close"].to_numpy(dtype=np.float64)
+    n = close.shape[0]
+    y_close = float(close[-2])
+
+    base = _IntradayBase(
+        df=df,
+        rt_date=rt_date,
+        rt_open=float(latest[1]),
+        rt_close=rt_close,
+        rt_high=float(latest[3]),
+        rt_low=float(latest[4]),
+        rt_vol=float(latest[5]),
+        rt_amount=float(latest[6]),
+        ma5=_window_mean(close, n, 5),
+        ma20=_window_mean(close, n, 20),
+        prev_ma5=_window_mean(close, n - 1, 5),
+        prev_ma20=_window_mean(close, n - 1, 20),
+        y_close=y_close,
+        pct_chg=(rt_close - y_close) / y_close * 100 if y_close else None,
+    )
+    with _INTRADAY_BASE_CACHE_LOCK:
+        _INTRADAY_BASE_CACHE[cache_key] = (
+            time.monotonic() + EASTMONEY_CACHE_TTL,
+            base,
+        )
+    return base
+
+
+@functools.lru_cache(maxsize=4)
+def _get_mysql_engine(url: str):
+    """
+    按连接串缓存 SQLAlchemy engine（进程内各工具共用同一个连接池）。
+
+    说明：
+    - 每次调用都 create_engine 会让连接池失效，每次查询都重新建连（TCP + 认证）
+    - 延迟导入 sqlalchemy，避免在未安装依赖时影响其他 MCP 工具
+    - pool_recycle 定期回收连接，避免被 MySQL wait_timeout 断开后拿到失效连接
+    """
+    from sqlalchemy import create_engine  # type: ignore
+
+    return create_engine(
+        url, pool_pre_ping=True, pool_size=8, max_overflow=8, pool_recycle=1800
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _close_history_sql(limit: int):
+    """
+    读取最近 limit 条收盘价的 SQL（按 limit 缓存，同一语句对象跨调用复用）。
+
+    说明：
+    - MySQL 的 LIMIT 参数化在部分驱动上不稳定，这里用 int 拼接更稳（code 使用参数绑定防注入）
+    """
     # 延迟导入，避免在未安装依赖时影响其他 MCP 工具
-    from sqlalchemy import create_engine, text  # type: ignore
+    from sqlalchemy import text  # type: ignore
 
-    engine = create_engine(url, pool_pre_ping=True)
-    # MySQL 的 LIMIT 参数化在部分驱动上不稳定，这里用 int 拼接更稳（code 使用参数绑定防注入）
-    limit_int = int(limit)
-    sql = text(
+    return text(
         f"""
         SELECT trade_date, close
+        FROM (
+            SELECT trade_date, close
+            FROM stock_daily
+            WHERE ts_code = :code
+            ORDER BY trade_date DESC
+            LIMIT {limit}
+        ) latest
+        ORDER BY trade_date ASC
+        """
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _recent_daily_sql():
+    """
+    盘前/盘后分析读取最近 20 个交易日日线的 SQL（code 参数绑定，语句对象跨调用复用）。
+
+    说明：
+    - 只取报告与 prompt 实际用到的列（日期/最高/最低/收盘/涨跌幅），开盘、成交量、昨收不读
+    """
+    from sqlalchemy import text  # type: ignore
+
+    return text(
+        """
+        SELECT trade_date, high, low, close, pct_chg
         FROM stock_daily
         WHERE ts_code = :code
-        ORDER BY trade_date ASC
-        LIMIT {limit_int}
+        ORDER BY trade_date DESC
+        LIMIT 20
+        """
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _today_bars_sql():
+    """
+    盘后分析读取当日分钟快照的 SQL（code 参数绑定，语句对象跨调用复用）。
+
+    说明：
+    - 用 [CURDATE(), CURDATE() + 1 天) 区间代替 DATE(bar_time) = CURDATE()，可走主键 (ts_code, bar_time) 范围扫描
+    """
+    from sqlalchemy import text  # type: ignore
+
+    return text(
+        """
+        SELECT bar_time, open, high, low, close, vol, pct_chg
+        FROM stock_intraday_snapshot
+        WHERE ts_code = :code
+          AND bar_time >= CURDATE()
+          AND bar_time < CURDATE() + INTERVAL 1 DAY
+        ORDER BY bar_time ASC
         """
     )
 
+
+def _mysql_load_close_history(
+    code6: str, limit: int = 120, mysql_url: str | None = None
+) -> pd.DataFrame:
+    """
+    从 MySQL 的 stock_daily 表读取历史收盘价（用于盘中分析基线）。
+
+    说明：
+    - 表结构来自 create_stock_daily_table.sql
+    - 默认使用环境变量 MYSQL_URL；也可显式传 mysql_url
+    - 返回最近 limit 个交易日，按日期升序（排序在 SQL 里完成，调用方无需再 sort）
+    - 返回字段：trade_date（datetime64）、close（float）
+    - 结果缓存 MYSQL_HISTORY_CACHE_TTL 秒，返回的 DataFrame 是共享的，调用方不要原地修改
+    """
+    url = mysql_url or os.getenv("MYSQL_URL")
+    if not url:
+        raise ValueError("未配置 MYSQL_URL，无法从 MySQL 读取历史数据。")
+
+    cache_key = (code6, int(limit), url)
+    with _MYSQL_HISTORY_CACHE_LOCK:
+        cached = _MYSQL_HISTORY_CACHE.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    engine = _get_mysql_engine(url)
+    sql = _close_history_sql(int(limit))
+
+    # 只有两列、最多几百行：结果集直接转成定型的 numpy 数组再建 DataFrame，
+    # 不经过 pd.read_sql 的通用适配层，也不需要事后 to_datetime/to_numeric 逐列转换
     with engine.connect() as conn:
-        df = pd.read_sql(sql, conn, params={"code": code6})
+        result = conn.execute(sql, {"code": code6}).all()
 
+    trade_dates = np.array([r[0] for r in result], dtype="datetime64[D]")
+    # Decimal 直接转 float64；NULL 转为 NaN，随后丢弃
+    closes = np.array(
+        [np.nan if r[1] is None else r[1] for r in result], dtype=np.float64
+    )
+    df = pd.DataFrame({"trade_date": trade_dates, "close": closes})
     if df.empty:
+        # 空结果不缓存：刚入库的标的下次调用就能查到
         return df
 
-    df["trade_date"] = pd.to_datetime(df["trade_date"])
-    df["close"] = pd.to_numeric(df["close"], errors="coerce")
     df = df.dropna(subset=["trade_date", "close"])
+    with _MYSQL_HISTORY_CACHE_LOCK:
+        _MYSQL_HISTORY_CACHE[cache_key] = (
+            time.monotonic() + MYSQL_HISTORY_CACHE_TTL,
+            df,
+        )
     return df
 
 
@@ -229,7 +537,7 @@ def _get_daily_like_data(
     return pd.DataFrame(), "empty"
 
 
-@mcp.tool()
+@_threaded_tool
 def get_daily_data(
     ts_code: str = None,
     start_date: str = None,
@@ -276,7 +584,7 @@ def get_daily_data(
         return f"查询出错: {str(e)}"
 
 
-@mcp.tool()
+@_threaded_tool
 def get_stock_daily_data(
     stock_code: str, start_date: str = None, end_date: str = None
 ) -> str:
@@ -305,7 +613,7 @@ def get_stock_daily_data(
         return f"查询出错: {str(e)}"
 
 
-@mcp.tool()
+@_threaded_tool
 def analyze_and_suggest(stock_code: str) -> str:
     """
     分析个股涨跌趋势并提供投资建议（基于 MA5/MA20 均线策略）。
@@ -332,7 +640,12 @@ def analyze_and_suggest(stock_code: str) -> str:
         )
         if df.empty:
             return "未查询到相关数据，请检查股票代码或日期。"
-        df = df.sort_values("trade_date")  # 按日期升序
+        # 按日期升序：tushare 一般按日期降序返回，此时直接反转（视图）即可，只有乱序时才排序；
+        # 后面只按位置取数组/末行，不需要重建索引
+        if df["trade_date"].is_monotonic_decreasing:
+            df = df.iloc[::-1]
+        elif not df["trade_date"].is_monotonic_increasing:
+            df = df.sort_values("trade_date", ignore_index=True)
 
         # 数据不足时避免越界/均线无意义
         if len(df) < 20:
@@ -340,31 +653,33 @@ def analyze_and_suggest(stock_code: str) -> str:
                 f"数据量不足（仅 {len(df)} 条），无法计算 MA20，请扩大日期范围后重试。"
             )
 
-        # 计算均线
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
-
-        latest = df.iloc[-1]
-        prev = df.iloc[-2] if len(df) >= 2 else latest
+        # 均线只需最新/前一根：直接在收盘价数组上取小切片求均值，不生成整列、不按行取 Series
+        close = df["close"].to_numpy(dtype=np.float64)
+        n = close.shape[0]
+        ma5 = _window_mean(close, n, 5)
+        ma20 = _window_mean(close, n, 20)
+        prev_ma5 = _window_mean(close, n - 1, 5)
+        prev_ma20 = _window_mean(close, n - 1, 20)
+        latest_pct_chg = df["pct_chg"].iat[-1]
 
         # 简单逻辑判断
-        price_trend = "上涨" if latest["pct_chg"] > 0 else "下跌"
+        price_trend = "上涨" if latest_pct_chg > 0 else "下跌"
         ma_signal = (
             "金叉（买入信号）"
-            if (prev["ma5"] <= prev["ma20"] and latest["ma5"] > latest["ma20"])
+            if (prev_ma5 <= prev_ma20 and ma5 > ma20)
             else (
                 "死叉（卖出信号）"
-                if (prev["ma5"] >= prev["ma20"] and latest["ma5"] < latest["ma20"])
-                else "多头排列" if latest["ma5"] > latest["ma20"] else "空头排列"
+                if (prev_ma5 >= prev_ma20 and ma5 < ma20)
+                else "多头排列" if ma5 > ma20 else "空头排列"
             )
         )
 
         suggestion = f"""
         ### 股票分析报告: {stock_code}
-        - **最新收盘价**: {latest['close']} (涨跌幅: {latest['pct_chg']}%)
+        - **最新收盘价**: {df["close"].iat[-1]} (涨跌幅: {latest_pct_chg}%)
         - **当前趋势**: {price_trend}
         - **均线状态**: {ma_signal}
-        - **技术指标**: MA5={latest['ma5']:.2f}, MA20={latest['ma20']:.2f}
+        - **技术指标**: MA5={ma5:.2f}, MA20={ma20:.2f}
 
         **投资建议**:
         {"建议关注买入机会，趋势走强。" if "金叉" in ma_signal or "多头" in ma_signal else "建议观望或减仓，趋势偏弱。"}
@@ -375,7 +690,7 @@ def analyze_and_suggest(stock_code: str) -> str:
         return f"分析过程中出错: {str(e)}"
 
 
-@mcp.tool()
+@_threaded_tool
 def realtime_trade_signal(code: str, trade_date: str = None) -> str:
     """
     基于东财“日线级”K 线做实时买入/卖出信号分析（MA5/MA20 策略）。
@@ -406,33 +721,26 @@ def realtime_trade_signal(code: str, trade_date: str = None) -> str:
         else:
             target_row = rows[-1]
 
-        # 解析 close 序列用于均线（第 2 位为收盘/当前）
-        closes = []
-        dates = []
-        for r in rows:
-            if len(r) < 3:
-                continue
-            dates.append(r[0])
-            try:
-                closes.append(float(r[2]))
-            except Exception:
-                closes.append(float("nan"))
-
-        df = pd.DataFrame({"date": dates, "close": closes}).dropna()
-        if df.empty:
+        # 解析 close 序列用于均线（第 2 位为收盘/当前）；整列 to_numeric 转换，无法解析的记为 NaN 并剔除
+        valid = [r for r in rows if len(r) >= 3]
+        closes_all = pd.to_numeric([r[2] for r in valid], errors="coerce").astype(
+            np.float64
+        )
+        keep = np.flatnonzero(~np.isnan(closes_all))  # 保留行在 valid 中的原始位置
+        if keep.size == 0:
             return "行情数据解析失败，请稍后重试。"
+        dates = np.array([valid[i][0] for i in keep])
+        close = closes_all[keep]
 
-        # 取出目标日期所在位置（用于 prev/最新判断）
+        # 取出目标日期所在位置（用于 prev/最新判断）：东财日线按日期升序返回，
+        # YYYY-MM-DD 字符串的字典序即日期序，直接二分查找
         target_date = target_row[0]
-        idx_list = df.index[df["date"] == target_date].tolist()
-        if not idx_list:
-            # 兼容：目标日期可能被 dropna 过滤
+        pos = int(np.searchsorted(dates, target_date))
+        if pos >= dates.size or dates[pos] != target_date:
+            # 兼容：目标日期可能因收盘价无法解析被剔除
             return f"未找到指定日期 {target_date} 的有效收盘价数据。"
-        idx = idx_list[0]
-
-        # 均线计算（与现有策略一致）
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
+        # 前一根只有在原始序列里紧挨着目标日（中间没有被剔除的行）时才参与计算，与原逻辑一致
+        has_prev = pos > 0 and keep[pos - 1] == keep[pos] - 1
 
         latest_close = float(target_row[2])
         latest_open = float(target_row[1])
@@ -442,15 +750,16 @@ def realtime_trade_signal(code: str, trade_date: str = None) -> str:
         # 计算涨跌幅：使用上一交易日收盘（如果存在）
         prev_close = None
         pct_chg = None
-        if idx - 1 in df.index:
-            prev_close = float(df.loc[idx - 1, "close"])
+        if has_prev:
+            prev_close = float(close[pos - 1])
             if prev_close != 0:
                 pct_chg = (latest_close - prev_close) / prev_close * 100
 
-        ma5 = df.loc[idx, "ma5"]
-        ma20 = df.loc[idx, "ma20"]
-        prev_ma5 = df.loc[idx - 1, "ma5"] if idx - 1 in df.index else None
-        prev_ma20 = df.loc[idx - 1, "ma20"] if idx - 1 in df.index else None
+        # 均线只需目标日及前一日两根（与现有策略一致），按位置对收盘价小切片求均值
+        ma5 = _window_mean(close, pos + 1, 5)
+        ma20 = _window_mean(close, pos + 1, 20)
+        prev_ma5 = _window_mean(close, pos, 5) if has_prev else None
+        prev_ma20 = _window_mean(close, pos, 20) if has_prev else None
 
         # 信号判定：金叉/死叉优先，其次多空排列
         signal = "观望"
@@ -521,7 +830,7 @@ def realtime_trade_signal(code: str, trade_date: str = None) -> str:
         return f"分析过程中出错: {str(e)}"
 
 
-@mcp.tool()
+@_threaded_tool
 def intraday_trade_signal(code: str, mysql_url: str = None) -> str:
     """
     盘中买卖信号（结合 MySQL 历史 + 东财盘中最新价）。
@@ -541,66 +850,24 @@ def intraday_trade_signal(code: str, mysql_url: str = None) -> str:
     try:
         code6 = _normalize_code(code)
 
-        # 1) 读历史收盘（用于均线基线）
-        hist = _mysql_load_close_history(code6=code6, limit=200, mysql_url=mysql_url)
-        if hist.empty:
-            return f"未在 MySQL 中找到 {code6} 的历史数据，请先入库后再分析。"
-
-        # 2) 取东财最新一根（日线级，盘中动态）
-        rows = _eastmoney_fetch_kline_daily(code=code, limit=120)
-        if not rows:
-            return "未查询到东财行情数据，请检查证券代码。"
-        latest = rows[-1]
-        if len(latest) < 7:
-            return "东财行情数据解析失败，请稍后重试。"
-
-        rt_date = latest[0]  # YYYY-MM-DD
-        rt_open = float(latest[1])
-        rt_close = float(latest[2])  # 盘中“当前/收盘”
-        rt_high = float(latest[3])
-        rt_low = float(latest[4])
-        rt_vol = float(latest[5])
-        rt_amount = float(latest[6])
-
-        # 3) 组装用于均线计算的序列：用实时价替换同日 close；否则 append 一天
-        df = hist.copy()
-        df["date_str"] = df["trade_date"].dt.strftime("%Y-%m-%d")
-
-        if (df["date_str"] == rt_date).any():
-            df.loc[df["date_str"] == rt_date, "close"] = rt_close
-        else:
-            df = pd.concat(
-                [
-                    df,
-                    pd.DataFrame(
-                        {
-                            "trade_date": [pd.to_datetime(rt_date)],
-                            "close": [rt_close],
-                            "date_str": [rt_date],
-                        }
-                    ),
-                ],
-                ignore_index=True,
-            )
-
-        df = df.sort_values("trade_date")
-        if len(df) < 20:
-            return f"历史数据量不足（仅 {len(df)} 条），无法计算 MA20。"
-
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
-
-        latest_row = df.iloc[-1]
-        prev_row = df.iloc[-2]
-
-        ma5 = float(latest_row["ma5"])
-        ma20 = float(latest_row["ma20"])
-        prev_ma5 = float(prev_row["ma5"])
-        prev_ma20 = float(prev_row["ma20"])
-
-        # 4) 计算涨跌幅：用“昨收”（历史上一条 close）作为基准
-        y_close = float(prev_row["close"])
-        pct_chg = (rt_close - y_close) / y_close * 100 if y_close else None
+        # 1) 历史收盘（MySQL）+ 东财盘中最新一根 -> 收盘序列与均线（同一标的短时间内各工具共用）
+        base = _prepare_intraday_base(code, mysql_url)
+        if isinstance(base, str):
+            return base
+        df = base.df
+        rt_date = base.rt_date  # YYYY-MM-DD
+        rt_open = base.rt_open
+        rt_close = base.rt_close  # 盘中"当前/收盘"
+        rt_high = base.rt_high
+        rt_low = base.rt_low
+        rt_vol = base.rt_vol
+        rt_amount = base.rt_amount
+        ma5 = base.ma5
+        ma20 = base.ma20
+        prev_ma5 = base.prev_ma5
+        prev_ma20 = base.prev_ma20
+        y_close = base.y_close
+        pct_chg = base.pct_chg
 
         # 5) 信号判断（与 realtime_trade_signal 一致：金叉/死叉优先）
         signal = "观望"
@@ -650,13 +917,80 @@ def intraday_trade_signal(code: str, mysql_url: str = None) -> str:
         return f"分析过程中出错: {str(e)}"
 
 
-def _call_deepseek_api(prompt: str, temperature: float = 0.3) -> str:
+# 批量规则信号同时分析的标的数：与东财请求线程池（_IO_EXECUTOR）大小一致，避免请求排队或触发限流
+INTRADAY_BATCH_CONCURRENCY = 4
+
+
+@mcp.tool()
+async def intraday_trade_signal_batch(codes: str, mysql_url: str = None) -> str:
+    """
+    批量计算自选股的盘中买卖信号（MA5/MA20 规则，同 intraday_trade_signal）。
+
+    说明：
+    - codes：逗号分隔的多个代码，如 '159218,512400,000592.SZ'
+    - 各标的并发查询（同时不超过 INTRADAY_BATCH_CONCURRENCY 只），报告按传入顺序拼接，单只出错不影响其它
+    """
+    return await _run_per_code(
+        intraday_trade_signal,
+        codes,
+        INTRADAY_BATCH_CONCURRENCY,
+        mysql_url=mysql_url,
+    )
+
+
+DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# (连接, 读取) 超时：连不上时 5 秒内失败重试，不必等满整个生成超时
+DEEPSEEK_TIMEOUT = (5, 30)
+
+# DeepSeek 请求共用的 Session（首次调用时创建），复用 keep-alive 连接
+_DEEPSEEK_SESSION = None
+_DEEPSEEK_SESSION_LOCK = threading.Lock()
+
+# DeepSeek 结果的磁盘缓存（.cache/deepseek/）：交易信号按盘中行情+均线缓存解析结果，
+# 做T/盘前/盘后按 prompt 缓存原始回复；TTL 内直接复用，跳过几秒的 LLM 往返和 token 消耗
+DEEPSEEK_CACHE_TTL = 60.0
+_DEEPSEEK_CACHE = FileCache(DEFAULT_CACHE_DIR / "deepseek", ttl_seconds=DEEPSEEK_CACHE_TTL)
+
+
+def _get_deepseek_session():
+    """
+    获取 DeepSeek 请求共用的 requests.Session。
+
+    说明：
+    - 连续多次分析（多标的/多场景）复用同一条 TLS 连接，省掉每次的握手
+    - 只对连接失败做有限重试；POST 不按状态码重试，避免重复计费
+    """
+    global _DEEPSEEK_SESSION
+    if _DEEPSEEK_SESSION is None:
+        with _DEEPSEEK_SESSION_LOCK:
+            if _DEEPSEEK_SESSION is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                session = requests.Session()
+                session.mount(
+                    "https://",
+                    HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=8,
+                        max_retries=Retry(total=2, backoff_factor=0.3),
+                    ),
+                )
+                _DEEPSEEK_SESSION = session
+    return _DEEPSEEK_SESSION
+
+
+def _call_deepseek_api(
+    prompt: str, temperature: float = 0.3, max_tokens: int = 800
+) -> str:
     """
     调用 DeepSeek API 进行推理。
 
     参数：
     - prompt: 用户输入的 prompt
     - temperature: 温度参数（0-1），越低越确定性，推荐 0.3
+    - max_tokens: 回复的最大 token 数；只要求固定几行格式的调用可以调小，生成更快
 
     返回：
     - AI 的文本回复
@@ -664,13 +998,10 @@ def _call_deepseek_api(prompt: str, temperature: float = 0.3) -> str:
     环境变量：
     - DEEPSEEK_API_KEY: DeepSeek API 密钥
     """
-    import requests
-
     api_key = os.getenv("DEEPSEEK_API_KEY")
     if not api_key:
         raise ValueError("未配置 DEEPSEEK_API_KEY 环境变量")
 
-    api_url = "https://api.deepseek.com/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
@@ -685,15 +1016,39 @@ def _call_deepseek_api(prompt: str, temperature: float = 0.3) -> str:
             {"role": "user", "content": prompt},
         ],
         "temperature": temperature,
-        "max_tokens": 800,
+        "max_tokens": max_tokens,
     }
 
-    resp = requests.post(api_url, json=data, headers=headers, timeout=30)
+    # 请求体/响应体用 _json 编解码（有 orjson 时直接处理 bytes）
+    resp = _get_deepseek_session().post(
+        DEEPSEEK_API_URL, data=_json.dumps(data), headers=headers, timeout=DEEPSEEK_TIMEOUT
+    )
     resp.raise_for_status()
-    result = resp.json()
+    result = _json.loads(resp.content)
     return result["choices"][0]["message"]["content"]
 
 
+def _call_deepseek_cached(
+    prompt: str, temperature: float = 0.3, max_tokens: int = 800
+) -> str:
+    """
+    带精确匹配缓存的 _call_deepseek_api（与交易信号共用 _DEEPSEEK_CACHE，TTL 为 DEEPSEEK_CACHE_TTL）。
+
+    说明：
+    - prompt/temperature/max_tokens 完全相同时，TTL 内直接返回上次的回复，省掉整个 LLM 往返
+    - key 由三者拼成，FileCache 按其 MD5 落盘；空回复不缓存，请求出错时异常照常抛出、下次重试
+    """
+    cache_key = f"reply|{temperature!r}|{max_tokens}|{prompt}"
+    cached = _DEEPSEEK_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    reply = _call_deepseek_api(prompt, temperature=temperature, max_tokens=max_tokens)
+    if reply and reply.strip():
+        _DEEPSEEK_CACHE.set(cache_key, reply)
+    return reply
+
+
 def _build_deepseek_prompt(code: str, hist_df: pd.DataFrame, latest_data: dict) -> str:
     """
     构建喂给 DeepSeek 的 prompt。
@@ -707,18 +1062,20 @@ def _build_deepseek_prompt(code: str, hist_df: pd.DataFrame, latest_data: dict)
     - 格式化的 prompt 字符串
     """
     # 取最近 20 天历史（避免 prompt 过长）
-    recent_hist = hist_df.tail(20).copy()
-    recent_hist["date_str"] = recent_hist["trade_date"].dt.strftime("%Y-%m-%d")
-
-    # 构建历史数据表格（markdown 格式）
-    hist_lines = ["日期 | 收盘价 | MA5 | MA20"]
-    hist_lines.append("--- | --- | --- | ---")
-    for _, row in recent_hist.iterrows():
-        ma5_str = f"{row['ma5']:.4f}" if pd.notna(row["ma5"]) else "N/A"
-        ma20_str = f"{row['ma20']:.4f}" if pd.notna(row["ma20"]) else "N/A"
-        hist_lines.append(
-            f"{row['date_str']} | {row['close']:.4f} | {ma5_str} | {ma20_str}"
-        )
+    recent_hist = hist_df.tail(20)
+
+    # 构建历史数据表格（CSV 格式：比 markdown 表格少了分隔行和竖线填充，prompt 更短）
+    # 各列先取成数组再 zip 逐行格式化，不用 iterrows 为每行构造 Series
+    hist_lines = ["日期,收盘价,MA5,MA20"]
+    for d, c, m5, m20 in zip(
+        recent_hist["trade_date"].dt.strftime("%Y-%m-%d").to_numpy(),
+        recent_hist["close"].to_numpy(dtype=np.float64),
+        recent_hist["ma5"].to_numpy(dtype=np.float64),
+        recent_hist["ma20"].to_numpy(dtype=np.float64),
+    ):
+        ma5_str = "N/A" if np.isnan(m5) else f"{m5:.4f}"
+        ma20_str = "N/A" if np.isnan(m20) else f"{m20:.4f}"
+        hist_lines.append(f"{d},{c:.4f},{ma5_str},{ma20_str}")
     hist_table = "\n".join(hist_lines)
 
     prompt = f"""
@@ -735,7 +1092,7 @@ def _build_deepseek_prompt(code: str, hist_df: pd.DataFrame, latest_data: dict)
         - **最低**: {latest_data['low']}
         - **成交量（手）**: {latest_data['vol']}
         - **成交额（元）**: {latest_data['amount']}
-        - **涨跌幅**: {latest_data['pct_chg']}%
+        - **涨跌幅**: {latest_data['pct_chg']}
         - **MA5**: {latest_data['ma5']:.4f}
         - **MA20**: {latest_data['ma20']:.4f}
         - **昨收**: {latest_data['pre_close']}
@@ -755,6 +1112,18 @@ def _build_deepseek_prompt(code: str, hist_df: pd.DataFrame, latest_data: dict)
     return prompt
 
 
+# DeepSeek 交易信号回复的字段行：'信号: 买入' / '止损位：1.23'（半角/全角冒号均可）
+_DEEPSEEK_FIELD_RE = re.compile(
+    r"^[^\S\n]*(信号|理由|止损位|目标位)[:：][^\S\n]*(.*?)[^\S\n]*$", re.MULTILINE
+)
+_DEEPSEEK_FIELD_KEYS = {
+    "信号": "signal",
+    "理由": "reason",
+    "止损位": "stop_loss",
+    "目标位": "target",
+}
+
+
 def _parse_deepseek_response(response: str) -> dict:
     """
     解析 DeepSeek 返回的交易信号。
@@ -776,22 +1145,14 @@ def _parse_deepseek_response(response: str) -> dict:
         "raw": response,
     }
 
-    lines = response.strip().split("\n")
-    for line in lines:
-        line = line.strip()
-        if line.startswith("信号:") or line.startswith("信号："):
-            result["signal"] = line.split(":", 1)[-1].split("：", 1)[-1].strip()
-        elif line.startswith("理由:") or line.startswith("理由："):
-            result["reason"] = line.split(":", 1)[-1].split("：", 1)[-1].strip()
-        elif line.startswith("止损位:") or line.startswith("止损位："):
-            result["stop_loss"] = line.split(":", 1)[-1].split("：", 1)[-1].strip()
-        elif line.startswith("目标位:") or line.startswith("目标位："):
-            result["target"] = line.split(":", 1)[-1].split("：", 1)[-1].strip()
+    # 一次 finditer 扫完全部字段；同一字段出现多次时以最后一次为准
+    for m in _DEEPSEEK_FIELD_RE.finditer(response):
+        result[_DEEPSEEK_FIELD_KEYS[m.group(1)]] = m.group(2)
 
     return result
 
 
-@mcp.tool()
+@_threaded_tool
 def deepseek_trade_signal(code: str, mysql_url: str = None) -> str:
     """
     使用 DeepSeek AI 分析盘中交易信号（结合 MySQL 历史 + 东财实时数据）。
@@ -816,62 +1177,24 @@ def deepseek_trade_signal(code: str, mysql_url: str = None) -> str:
     try:
         code6 = _normalize_code(code)
 
-        # 1) 读历史收盘（用于均线基线 + 喂给 AI）
-        hist = _mysql_load_close_history(code6=code6, limit=200, mysql_url=mysql_url)
-        if hist.empty:
-            return f"未在 MySQL 中找到 {code6} 的历史数据，请先入库后再分析。"
-
-        # 2) 取东财最新一根（日线级，盘中动态）
-        rows = _eastmoney_fetch_kline_daily(code=code, limit=120)
-        if not rows:
-            return "未查询到东财行情数据，请检查证券代码。"
-        latest = rows[-1]
-        if len(latest) < 7:
-            return "东财行情数据解析失败，请稍后重试。"
-
-        rt_date = latest[0]  # YYYY-MM-DD
-        rt_open = float(latest[1])
-        rt_close = float(latest[2])  # 盘中"当前/收盘"
-        rt_high = float(latest[3])
-        rt_low = float(latest[4])
-        rt_vol = float(latest[5])
-        rt_amount = float(latest[6])
-
-        # 3) 组装用于均线计算的序列：用实时价替换同日 close；否则 append 一天
-        df = hist.copy()
-        df["date_str"] = df["trade_date"].dt.strftime("%Y-%m-%d")
-
-        if (df["date_str"] == rt_date).any():
-            df.loc[df["date_str"] == rt_date, "close"] = rt_close
-        else:
-            df = pd.concat(
-                [
-                    df,
-                    pd.DataFrame(
-                        {
-                            "trade_date": [pd.to_datetime(rt_date)],
-                            "close": [rt_close],
-                            "date_str": [rt_date],
-                        }
-                    ),
-                ],
-                ignore_index=True,
-            )
-
-        df = df.sort_values("trade_date")
-        if len(df) < 20:
-            return f"历史数据量不足（仅 {len(df)} 条），无法计算 MA20。"
-
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
-
-        latest_row = df.iloc[-1]
-        prev_row = df.iloc[-2]
-
-        ma5 = float(latest_row["ma5"])
-        ma20 = float(latest_row["ma20"])
-        y_close = float(prev_row["close"])
-        pct_chg = (rt_close - y_close) / y_close * 100 if y_close else None
+        # 1) 历史收盘（MySQL）+ 东财盘中最新一根 -> 收盘序列与均线（同一标的短时间内各工具共用）
+        base = _prepare_intraday_base(code, mysql_url)
+        if isinstance(base, str):
+            return base
+        df = base.df
+        rt_date = base.rt_date  # YYYY-MM-DD
+        rt_open = base.rt_open
+        rt_close = base.rt_close  # 盘中"当前/收盘"
+        rt_high = base.rt_high
+        rt_low = base.rt_low
+        rt_vol = base.rt_vol
+        rt_amount = base.rt_amount
+        ma5 = base.ma5
+        ma20 = base.ma20
+        y_close = base.y_close
+        pct_chg = base.pct_chg
+        # 涨跌幅 prompt 与报告共用，只格式化一次
+        pct_str = f"{pct_chg:.2f}%" if pct_chg is not None else "未知"
 
         # 4) 构建 DeepSeek prompt
         latest_data = {
@@ -882,23 +1205,27 @@ def deepseek_trade_signal(code: str, mysql_url: str = None) -> str:
             "low": rt_low,
             "vol": rt_vol,
             "amount": rt_amount,
-            "pct_chg": f"{pct_chg:.2f}" if pct_chg is not None else "N/A",
+            "pct_chg": pct_str,
             "ma5": ma5,
             "ma20": ma20,
             "pre_close": y_close,
         }
 
-        prompt = _build_deepseek_prompt(code=code6, hist_df=df, latest_data=latest_data)
-
-        # 5) 调用 DeepSeek API
-        ai_response = _call_deepseek_api(prompt, temperature=0.3)
-
-        # 6) 解析 AI 返回
-        parsed = _parse_deepseek_response(ai_response)
+        # 5) 调用 DeepSeek API 并解析返回（行情未变时命中磁盘缓存，不再构建 prompt 与请求）
+        # key 覆盖 prompt 里的全部盘中字段且不做舍入：任一价位/量额变化都必须重新请求
+        tick = (rt_open, rt_close, rt_high, rt_low, rt_vol, rt_amount)
+        cache_key = "|".join([code6, rt_date, *map(str, tick + (y_close, ma5, ma20))])
+        parsed = _DEEPSEEK_CACHE.get(cache_key)
+        if parsed is None:
+            prompt = _build_deepseek_prompt(
+                code=code6, hist_df=_tail_with_ma(df, 20), latest_data=latest_data
+            )
+            # 只要求输出 信号/理由/止损位/目标位 四行，300 token 足够
+            ai_response = _call_deepseek_api(prompt, temperature=0.3, max_tokens=300)
+            parsed = _parse_deepseek_response(ai_response)
+            _DEEPSEEK_CACHE.set(cache_key, parsed)
 
         # 7) 格式化输出报告
-        pct_str = f"{pct_chg:.2f}%" if pct_chg is not None else "未知"
-
         report = f"""
             ### DeepSeek AI 交易信号报告: {code6}
             - **盘中日期**: {rt_date}
@@ -929,7 +1256,91 @@ def deepseek_trade_signal(code: str, mysql_url: str = None) -> str:
         return f"DeepSeek 分析过程中出错: {str(e)}"
 
 
-@mcp.tool()
+@functools.lru_cache(maxsize=1)
+def _intraday_bars_sql():
+    """读取某个交易日分钟快照的 SQL（语句对象跨调用复用）。"""
+    from sqlalchemy import text  # type: ignore
+
+    return text(
+        """
+        SELECT bar_time, open, high, low, close, vol, pct_chg
+        FROM stock_intraday_snapshot
+        WHERE ts_code = :code AND bar_time >= :day_start AND bar_time < :day_end
+        ORDER BY bar_time
+        """
+    )
+
+
+# 分钟快照的进程内缓存粒度：同一 (code6, trade_date) 在同一个 60 秒时间片内只查一次 MySQL
+# （如同一标的先后按空仓/持仓两种参数做T分析）；换时间片就重新读，盘中新入库的分钟线不会被缓存挡住
+INTRADAY_BARS_CACHE_TTL = 60.0
+
+
+@functools.lru_cache(maxsize=32)
+def _fetch_intraday_bars_cached(
+    code6: str, trade_date: str, mysql_url: str, time_slot: int
+) -> tuple[MappingProxyType, ...]:
+    """
+    按 (code6, trade_date, mysql_url, time_slot) 缓存的分钟快照读取。
+
+    说明：
+    - 返回只读的 tuple[MappingProxyType]，多个调用方共用同一份结果也改不动缓存内容
+    - 查询出错直接抛出：lru_cache 不缓存异常，一次瞬时故障不会让后续调用一直拿到空结果
+    - time_slot 由调用方按 INTRADAY_BARS_CACHE_TTL 分桶传入，只参与缓存 key
+    """
+    # 复用按连接串缓存的引擎
+    engine = _get_mysql_engine(mysql_url)
+
+    # 按 [当天 0 点, 次日 0 点) 的区间查，能直接走主键 (ts_code, bar_time) 的范围扫描
+    day_start = datetime.datetime.strptime(trade_date, "%Y-%m-%d")
+    day_end = day_start + datetime.timedelta(days=1)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            _intraday_bars_sql(),
+            {"code": code6, "day_start": day_start, "day_end": day_end},
+        ).all()
+
+    return tuple(
+        MappingProxyType(
+            {
+                "time": row[0].strftime("%H:%M"),
+                "open": float(row[1]),
+                "high": float(row[2]),
+                "low": float(row[3]),
+                "close": float(row[4]),
+                "vol": int(row[5]),
+                "pct_chg": float(row[6]) if row[6] else 0,
+            }
+        )
+        for row in rows
+    )
+
+
+def _load_intraday_bars(
+    code6: str, trade_date: str, mysql_url: str | None = None
+) -> tuple[MappingProxyType, ...]:
+    """
+    从 MySQL 的 stock_intraday_snapshot 表读取某个交易日的分钟快照（用于做T分析）。
+
+    说明：
+    - 默认使用环境变量 MYSQL_URL；也可显式传 mysql_url
+    - 读取失败（未配置/表不存在等）不影响主流程，返回空 tuple（失败结果不进缓存）
+    - 同一标的、同一交易日在 INTRADAY_BARS_CACHE_TTL 时间片内的重复调用复用上次查询结果
+    """
+    # 未配置 MySQL 是预期内的情况，直接返回，不走异常路径
+    MYSQL_URL = mysql_url or os.getenv("MYSQL_URL")
+    if not MYSQL_URL:
+        return ()
+
+    time_slot = int(time.monotonic() // INTRADAY_BARS_CACHE_TTL)
+    try:
+        return _fetch_intraday_bars_cached(code6, trade_date, MYSQL_URL, time_slot)
+    except Exception:
+        # 读取失败不影响主流程，只是没有分钟线数据而已
+        return ()
+
+
+@_threaded_tool
 def deepseek_intraday_t_signal(
     code: str,
     position_cost: float = None,
@@ -969,116 +1380,37 @@ def deepseek_intraday_t_signal(
     try:
         code6 = _normalize_code(code)
 
-        # 1) 读历史收盘（用于均线基线 + 喂给 AI）
-        hist = _mysql_load_close_history(code6=code6, limit=200, mysql_url=mysql_url)
-        if hist.empty:
-            return f"未在 MySQL 中找到 {code6} 的历史数据，请先入库后再分析。"
-
-        # 2) 取东财最新一根（日线级，盘中动态）
-        rows = _eastmoney_fetch_kline_daily(code=code, limit=120)
-        if not rows:
-            return "未查询到东财行情数据，请检查证券代码。"
-        latest = rows[-1]
-        if len(latest) < 7:
-            return "东财行情数据解析失败，请稍后重试。"
-
-        rt_date = latest[0]  # YYYY-MM-DD
-        rt_open = float(latest[1])
-        rt_close = float(latest[2])  # 盘中"当前/收盘"
-        rt_high = float(latest[3])
-        rt_low = float(latest[4])
-        rt_vol = float(latest[5])
-        rt_amount = float(latest[6])
-
-        # 3) 组装用于均线计算的序列
-        df = hist.copy()
-        df["date_str"] = df["trade_date"].dt.strftime("%Y-%m-%d")
-
-        if (df["date_str"] == rt_date).any():
-            df.loc[df["date_str"] == rt_date, "close"] = rt_close
-        else:
-            df = pd.concat(
-                [
-                    df,
-                    pd.DataFrame(
-                        {
-                            "trade_date": [pd.to_datetime(rt_date)],
-                            "close": [rt_close],
-                            "date_str": [rt_date],
-                        }
-                    ),
-                ],
-                ignore_index=True,
-            )
-
-        df = df.sort_values("trade_date")
-        if len(df) < 20:
-            return f"历史数据量不足（仅 {len(df)} 条），无法计算 MA20。"
-
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
-
-        latest_row = df.iloc[-1]
-        prev_row = df.iloc[-2]
-
-        ma5 = float(latest_row["ma5"])
-        ma20 = float(latest_row["ma20"])
-        y_close = float(prev_row["close"])
-        pct_chg = (rt_close - y_close) / y_close * 100 if y_close else None
+        # 1) 历史收盘（MySQL）+ 东财盘中最新一根 -> 收盘序列与均线（同一标的短时间内各工具共用）
+        base = _prepare_intraday_base(code, mysql_url)
+        if isinstance(base, str):
+            return base
+        df = base.df
+        rt_date = base.rt_date  # YYYY-MM-DD
+        rt_open = base.rt_open
+        rt_close = base.rt_close  # 盘中"当前/收盘"
+        rt_high = base.rt_high
+        rt_low = base.rt_low
+        rt_vol = base.rt_vol
+        rt_amount = base.rt_amount
+        ma5 = base.ma5
+        ma20 = base.ma20
+        y_close = base.y_close
+        pct_chg = base.pct_chg
 
         # 4) 读取今天的分钟线数据（如果有）
-        intraday_bars = []
-        try:
-            from sqlalchemy import create_engine, text
-
-            # 获取 MySQL URL
-            MYSQL_URL = mysql_url or os.getenv("MYSQL_URL")
-            if not MYSQL_URL:
-                raise ValueError("未配置 MYSQL_URL")
-
-            # 创建数据库引擎
-            engine = create_engine(MYSQL_URL)
-
-            with engine.connect() as conn:
-                sql = text(
-                    """
-                    SELECT bar_time, open, high, low, close, vol, pct_chg
-                    FROM stock_intraday_snapshot
-                    WHERE ts_code = :code AND DATE(bar_time) = :date
-                    ORDER BY bar_time
-                """
-                )
-                result = conn.execute(sql, {"code": code6, "date": rt_date})
-                for row in result:
-                    intraday_bars.append(
-                        {
-                            "time": row[0].strftime("%H:%M"),
-                            "open": float(row[1]),
-                            "high": float(row[2]),
-                            "low": float(row[3]),
-                            "close": float(row[4]),
-                            "vol": int(row[5]),
-                            "pct_chg": float(row[6]) if row[6] else 0,
-                        }
-                    )
-        except Exception as e:
-            # 读取失败不影响主流程，只是没有分钟线数据而已
-            intraday_bars = []
-
-        # 5) 计算盘中关键位置
-        # 日内振幅
-        intraday_range = ((rt_high - rt_low) / y_close * 100) if y_close else 0
+        intraday_bars = _load_intraday_bars(code6, rt_date, mysql_url)
+
+        # 5) 计算盘中关键位置，prompt 与报告共用的数值只格式化一次
         # 当前价格在日内区间的位置（0-1，0.5表示中轴）
         position_in_range = (
             ((rt_close - rt_low) / (rt_high - rt_low)) if (rt_high > rt_low) else 0.5
         )
-        # 相对昨收的位置
-        vs_pre_close = ((rt_close - y_close) / y_close * 100) if y_close else 0
+        pct_str = f"{pct_chg:.2f}%" if pct_chg is not None else "未知"
 
         # 6) 构建专门用于做T的 prompt
         prompt = _build_intraday_t_prompt(
             code=code6,
-            hist_df=df.tail(10),  # 只取最近10天，减少token消耗
+            hist_df=_tail_with_ma(df, 10),  # 只取最近10天，减少token消耗
             current_data={
                 "date": rt_date,
                 "open": rt_open,
@@ -1087,13 +1419,11 @@ def deepseek_intraday_t_signal(
                 "low": rt_low,
                 "vol": rt_vol,
                 "amount": rt_amount,
-                "pct_chg": f"{pct_chg:.2f}" if pct_chg is not None else "N/A",
+                "pct_chg": pct_str,
                 "ma5": ma5,
                 "ma20": ma20,
                 "pre_close": y_close,
-                "intraday_range": f"{intraday_range:.2f}%",
                 "position_in_range": f"{position_in_range:.1%}",
-                "vs_pre_close": f"{vs_pre_close:.2f}%",
             },
             position_info={
                 "cost": position_cost,
@@ -1103,14 +1433,13 @@ def deepseek_intraday_t_signal(
         )
 
         # 6) 调用 DeepSeek API
-        ai_response = _call_deepseek_api(prompt, temperature=0.2)  # 温度更低，更确定性
+        # 温度更低，更确定性；回复是 3 行简析 + 6 个字段，500 token 足够，封顶生成时间
+        ai_response = _call_deepseek_cached(prompt, temperature=0.2, max_tokens=500)
 
         # 7) 解析 AI 返回
         parsed = _parse_intraday_t_response(ai_response)
 
         # 8) 格式化输出报告
-        pct_str = f"{pct_chg:.2f}%" if pct_chg is not None else "未知"
-
         position_info_str = ""
         if position_cost:
             profit_pct = (rt_close - position_cost) / position_cost * 100
@@ -1127,9 +1456,7 @@ def deepseek_intraday_t_signal(
 
         # 根据AI指令生成明确的操作建议
         action = parsed["action"]
-        action_emoji = (
-            "🔴" if action == "立即卖出" else ("🟢" if action == "立即买入" else "⚪")
-        )
+        action_emoji = _INTRADAY_T_ACTION_EMOJI.get(action, "⚪")
 
         report = f"""
         ### {action_emoji} AI 操作指令: {code6}
@@ -1161,6 +1488,29 @@ def deepseek_intraday_t_signal(
         return f"DeepSeek 盘中做T分析过程中出错: {str(e)}"
 
 
+# 批量做T分析同时在途的 DeepSeek 请求上限（受接口限流约束，与 DeepSeek Session 连接池大小一致）
+DEEPSEEK_BATCH_CONCURRENCY = 8
+
+
+@mcp.tool()
+async def deepseek_intraday_t_batch(codes: str, mysql_url: str = None) -> str:
+    """
+    批量分析自选股的盘中做T信号（DeepSeek AI）。
+
+    说明：
+    - codes：逗号分隔的多个代码，如 '159218,512400,000592.SZ'
+    - 各标的并发分析（单个分析耗时主要在 LLM 往返上），总耗时约等于最慢的一只，而不是逐只累加
+    - 同时在途的请求不超过 DEEPSEEK_BATCH_CONCURRENCY；报告按传入顺序拼接，单只出错不影响其它
+    - 不带持仓信息；需要按仓位给建议时请逐只调用 deepseek_intraday_t_signal
+    """
+    return await _run_per_code(
+        deepseek_intraday_t_signal,
+        codes,
+        DEEPSEEK_BATCH_CONCURRENCY,
+        mysql_url=mysql_url,
+    )
+
+
 def _build_intraday_t_prompt(
     code: str,
     hist_df: pd.DataFrame,
@@ -1170,107 +1520,93 @@ def _build_intraday_t_prompt(
 ) -> str:
     """
     构建专门用于盘中做T的 prompt。
+
+    说明：
+    - prompt 按 token 计费且影响首字延迟：表格用 CSV、说明文字合并成短句、整体不带缩进
+    - 末尾的输出格式字段名与 _parse_intraday_t_response 对应，修改时两边保持一致
     """
-    # 历史数据表格（精简版）
-    recent_hist = hist_df.copy()
-    recent_hist["date_str"] = recent_hist["trade_date"].dt.strftime("%Y-%m-%d")
-
-    hist_lines = ["日期 | 收盘 | MA5 | MA20"]
-    hist_lines.append("--- | --- | --- | ---")
-    for _, row in recent_hist.iterrows():
-        ma5_str = f"{row['ma5']:.3f}" if pd.notna(row["ma5"]) else "N/A"
-        ma20_str = f"{row['ma20']:.3f}" if pd.notna(row["ma20"]) else "N/A"
-        hist_lines.append(
-            f"{row['date_str']} | {row['close']:.3f} | {ma5_str} | {ma20_str}"
-        )
+    # 历史数据表格（CSV，精简版）
+    hist_lines = ["日期,收盘,MA5,MA20"]
+    for d, c, m5, m20 in zip(
+        hist_df["trade_date"].dt.strftime("%Y-%m-%d").to_numpy(),
+        hist_df["close"].to_numpy(dtype=np.float64),
+        hist_df["ma5"].to_numpy(dtype=np.float64),
+        hist_df["ma20"].to_numpy(dtype=np.float64),
+    ):
+        ma5_str = "N/A" if np.isnan(m5) else f"{m5:.3f}"
+        ma20_str = "N/A" if np.isnan(m20) else f"{m20:.3f}"
+        hist_lines.append(f"{d},{c:.3f},{ma5_str},{ma20_str}")
     hist_table = "\n".join(hist_lines)
 
     # 分钟线数据表格（如果有）
-    intraday_table = ""
-    if intraday_bars and len(intraday_bars) > 0:
+    if intraday_bars:
         # 只展示最近 30 条，避免 token 过多
-        recent_bars = intraday_bars[-30:] if len(intraday_bars) > 30 else intraday_bars
-        bar_lines = ["时间 | 开盘 | 最高 | 最低 | 收盘 | 成交量(手) | 涨跌%"]
-        bar_lines.append("--- | --- | --- | --- | --- | --- | ---")
-        for bar in recent_bars:
+        bar_lines = ["时间,开,高,低,收,量(手),涨跌%"]
+        for bar in intraday_bars[-30:]:
             # 成交量转换为手（1手=100股）
             vol_lots = bar["vol"] // 100 if bar["vol"] > 0 else 0
             bar_lines.append(
-                f"{bar['time']} | {bar['open']:.3f} | {bar['high']:.3f} | "
-                f"{bar['low']:.3f} | {bar['close']:.3f} | {vol_lots:,} | {bar['pct_chg']:.2f}%"
+                f"{bar['time']},{bar['open']:.3f},{bar['high']:.3f},"
+                f"{bar['low']:.3f},{bar['close']:.3f},{vol_lots},{bar['pct_chg']:.2f}"
             )
         intraday_table = "\n".join(bar_lines)
     else:
         intraday_table = "暂无分钟线数据（可能尚未采集或盘前时段）"
 
-    position_text = ""
-    if position_info.get("cost"):
-        profit = (
-            (current_data["close"] - position_info["cost"])
-            / position_info["cost"]
-            * 100
-        )
-        position_text = f"""
-        ## 当前持仓
-        - **成本价**: {position_info['cost']:.3f}
-        - **当前仓位**: {position_info['ratio']:.1%}
-        - **浮动盈亏**: {profit:+.2f}%
-        """
+    position_text = (
+        _format_t_position(position_info, current_data["close"])
+        if position_info.get("cost")
+        else ""
+    )
 
-    prompt = f"""
-        你是一个盘中交易助手，给出简单明确的操作指令。
+    prompt = f"""你是盘中交易助手，给出简单明确的操作指令。
 
-        ## 历史行情（最近 10 天）
-        {hist_table}
+## 近10日日线
+{hist_table}
 
-        ## 当前盘中实时数据
-        - **日期**: {current_data['date']}
-        - **当前价**: {current_data['close']}
-        - **今开**: {current_data['open']}
-        - **最高/最低**: {current_data['high']} / {current_data['low']}
-        - **日内位置**: {current_data['position_in_range']} (0%=最低, 100%=最高)
-        - **涨跌幅**: {current_data['pct_chg']}
-        - **MA5**: {current_data['ma5']:.4f}
-        - **MA20**: {current_data['ma20']:.4f}
-        - **昨收**: {current_data['pre_close']}
-        {position_text}
-
-        ## 日内分钟线走势（最近 30 分钟）
-        {intraday_table}
-
-        ## 任务要求
-
-        **请结合历史日线、当前实时数据和日内分钟线走势**，分析以下要点：
-        1. **日内趋势**：是持续上涨/下跌还是震荡反复？价格运行轨迹如何？
-        2. **量价关系**：上涨/下跌时成交量如何变化？是否健康？
-        3. **当前位置**：是第一次冲高还是反复测试？支撑/压力是否有效？
-        4. **多空力量**：买盘强还是卖盘强？是否有明显的多空转换信号？
-
-        基于以上综合分析，给出**当前时刻是否应该立即操作**的明确建议。
-
-        **只从以下3个指令中选择1个**：
-        1. **立即买入** - 现在就是好的买点（回调到支撑、突破确认、多头力量强等）
-        2. **立即卖出** - 现在就是好的卖点（冲高到压力、趋势转弱、空头力量强等）
-        3. **暂不操作** - 位置不佳或方向不明，等待更好时机
-
-        **输出格式（严格按此格式）**：
-
-        首先进行详细分析：
-        日内趋势分析: [描述分钟线走势特征，2-3句话]
-        量价配合: [分析成交量变化，1-2句话]
-        关键位置: [当前支撑/压力位，1-2句话]
-
-        然后给出操作建议（每行一个字段）：
-        操作指令: [立即买入/立即卖出/暂不操作]
-        执行价格: [当前价附近的具体价格，如 0.869]
-        建议数量: [具体占总资金的比例，如 20%]
-        止损价格: [具体价格]
-        目标价格: [具体价格]
-        核心原因: [综合上述分析的一句话结论，不超过50字]
-        """
+## 盘中实时
+日期 {current_data['date']}，当前价 {current_data['close']}，今开 {current_data['open']}，最高/最低 {current_data['high']}/{current_data['low']}，昨收 {current_data['pre_close']}
+日内位置 {current_data['position_in_range']}（0%=最低，100%=最高），涨跌幅 {current_data['pct_chg']}，MA5 {current_data['ma5']:.4f}，MA20 {current_data['ma20']:.4f}
+{position_text}
+## 分钟线（最近30根）
+{intraday_table}
+
+## 任务
+结合日线、实时数据与分钟线，分析日内趋势（持续涨跌或震荡）、量价关系、当前位置（首次冲高还是反复测试，支撑/压力是否有效）、多空力量，判断当前是否应立即操作。
+只选1个指令：立即买入（回调到支撑/突破确认/多头强）、立即卖出（冲高到压力/趋势转弱/空头强）、暂不操作（位置不佳或方向不明）。
+
+## 输出格式（严格按此格式，每行一个字段）
+日内趋势分析: [分钟线走势特征，2-3句]
+量价配合: [成交量变化，1-2句]
+关键位置: [支撑/压力位，1-2句]
+操作指令: [立即买入/立即卖出/暂不操作]
+执行价格: [当前价附近的具体价格，如 0.869]
+建议数量: [占总资金的比例，如 20%]
+止损价格: [具体价格]
+目标价格: [具体价格]
+核心原因: [一句话结论，不超过50字]
+"""
     return prompt
 
 
+# 盘中做T回复的字段行：'操作指令: 做T买入' / '止损价格：1.23'（半角/全角冒号均可），同一字段以最后一行为准
+_INTRADAY_T_FIELD_RE = re.compile(
+    r"^[^\S\n]*(操作指令|执行价格|建议数量|止损价格|目标价格|核心原因)[:：][^\S\n]*(.*?)[^\S\n]*$",
+    re.MULTILINE,
+)
+_INTRADAY_T_FIELD_KEYS = {
+    "操作指令": "action",
+    "执行价格": "price",
+    "建议数量": "size",
+    "止损价格": "stop_loss",
+    "目标价格": "target",
+    "核心原因": "reason",
+}
+
+# 操作指令 -> 报告标题 emoji（暂不操作及无法识别的指令用 ⚪）
+_INTRADAY_T_ACTION_EMOJI = {"立即买入": "🟢", "立即卖出": "🔴"}
+
+
 def _parse_intraday_t_response(response: str) -> dict:
     """
     解析 DeepSeek 盘中做T信号（简化版）。
@@ -1285,44 +1621,8 @@ def _parse_intraday_t_response(response: str) -> dict:
         "raw": response,
     }
 
-    lines = response.strip().split("\n")
-
-    for line in lines:
-        line_stripped = line.strip()
-
-        # 匹配新的字段格式
-        if line_stripped.startswith("操作指令:") or line_stripped.startswith(
-            "操作指令："
-        ):
-            result["action"] = (
-                line_stripped.split(":", 1)[-1].split("：", 1)[-1].strip()
-            )
-        elif line_stripped.startswith("执行价格:") or line_stripped.startswith(
-            "执行价格："
-        ):
-            result["price"] = line_stripped.split(":", 1)[-1].split("：", 1)[-1].strip()
-        elif line_stripped.startswith("建议数量:") or line_stripped.startswith(
-            "建议数量："
-        ):
-            result["size"] = line_stripped.split(":", 1)[-1].split("：", 1)[-1].strip()
-        elif line_stripped.startswith("止损价格:") or line_stripped.startswith(
-            "止损价格："
-        ):
-            result["stop_loss"] = (
-                line_stripped.split(":", 1)[-1].split("：", 1)[-1].strip()
-            )
-        elif line_stripped.startswith("目标价格:") or line_stripped.startswith(
-            "目标价格："
-        ):
-            result["target"] = (
-                line_stripped.split(":", 1)[-1].split("：", 1)[-1].strip()
-            )
-        elif line_stripped.startswith("核心原因:") or line_stripped.startswith(
-            "核心原因："
-        ):
-            result["reason"] = (
-                line_stripped.split(":", 1)[-1].split("：", 1)[-1].strip()
-            )
+    for m in _INTRADAY_T_FIELD_RE.finditer(response):
+        result[_INTRADAY_T_FIELD_KEYS[m.group(1)]] = m.group(2)
 
     return result
 
@@ -1344,34 +1644,24 @@ def deepseek_premarket_analysis(
     - str: 格式化的盘前分析报告
     """
     try:
-        from sqlalchemy import create_engine
-
         # 1. 从 MySQL 读取历史数据
         mysql_url = os.getenv("MYSQL_URL")
         if not mysql_url:
             return "❌ 盘前分析失败: 未配置 MYSQL_URL"
 
         code_6 = _normalize_code(code)
-        engine = create_engine(mysql_url)
+        engine = _get_mysql_engine(mysql_url)
 
-        query = f"""
-            SELECT trade_date, open, high, low, close, vol, pct_chg, pre_close
-            FROM stock_daily
-            WHERE ts_code = '{code_6}'
-            ORDER BY trade_date DESC
-            LIMIT 20
-        """
-        df = pd.read_sql(query, engine)
-        engine.dispose()
+        df = pd.read_sql(_recent_daily_sql(), engine, params={"code": code_6})
 
         if df.empty:
             return f"❌ 盘前分析失败: 未找到 {code} 的历史数据"
 
-        # 计算均线
-        df = df.sort_values("trade_date").reset_index(drop=True)
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
-        df = df.sort_values("trade_date", ascending=False).reset_index(drop=True)
+        # 计算均线：SQL 已按日期降序返回，反转成升序计算后再反转写回（不做两次排序）
+        close_asc = df["close"].iloc[::-1]
+        ma5, ma20 = _rolling_means(close_asc, 5, 20)
+        df["ma5"] = ma5[::-1]
+        df["ma20"] = ma20[::-1]
 
         # 2. 构建 Prompt
         latest = df.iloc[0]
@@ -1381,7 +1671,7 @@ def deepseek_premarket_analysis(
         prompt = _build_premarket_prompt(code, hist_df, latest, position_info)
 
         # 3. 调用 DeepSeek API
-        analysis = _call_deepseek_api(prompt)
+        analysis = _call_deepseek_cached(prompt)
         if not analysis:
             return "❌ 盘前分析失败: DeepSeek API 调用失败"
 
@@ -1425,43 +1715,29 @@ def deepseek_aftermarket_analysis(
     - str: 格式化的盘后分析报告
     """
     try:
-        from sqlalchemy import create_engine
-
         # 1. 从 MySQL 读取历史数据
         mysql_url = os.getenv("MYSQL_URL")
         if not mysql_url:
             return "❌ 盘后分析失败: 未配置 MYSQL_URL"
 
         code_6 = _normalize_code(code)
-        engine = create_engine(mysql_url)
+        engine = _get_mysql_engine(mysql_url)
 
-        query = f"""
-            SELECT trade_date, open, high, low, close, vol, pct_chg, pre_close
-            FROM stock_daily
-            WHERE ts_code = '{code_6}'
-            ORDER BY trade_date DESC
-            LIMIT 20
-        """
-        df = pd.read_sql(query, engine)
-
-        # 2. 读取今日分钟线数据
-        intraday_query = f"""
-            SELECT bar_time, open, high, low, close, vol, pct_chg
-            FROM stock_intraday_snapshot
-            WHERE ts_code = '{code_6}' AND DATE(bar_time) = CURDATE()
-            ORDER BY bar_time ASC
-        """
-        intraday_df = pd.read_sql(intraday_query, engine)
-        engine.dispose()
+        # 2. 读取今日分钟线数据：与日线查询互不依赖，放到后台线程与日线查询同时进行
+        intraday_future = _IO_EXECUTOR.submit(
+            pd.read_sql, _today_bars_sql(), engine, params={"code": code_6}
+        )
+        df = pd.read_sql(_recent_daily_sql(), engine, params={"code": code_6})
+        intraday_df = intraday_future.result()
 
         if df.empty:
             return f"❌ 盘后分析失败: 未找到 {code} 的历史数据"
 
-        # 计算均线
-        df = df.sort_values("trade_date").reset_index(drop=True)
-        df["ma5"] = df["close"].rolling(5).mean()
-        df["ma20"] = df["close"].rolling(20).mean()
-        df = df.sort_values("trade_date", ascending=False).reset_index(drop=True)
+        # 计算均线：SQL 已按日期降序返回，反转成升序计算后再反转写回（不做两次排序）
+        close_asc = df["close"].iloc[::-1]
+        ma5, ma20 = _rolling_means(close_asc, 5, 20)
+        df["ma5"] = ma5[::-1]
+        df["ma20"] = ma20[::-1]
 
         # 3. 构建 Prompt
         latest = df.iloc[0]
@@ -1470,18 +1746,12 @@ def deepseek_aftermarket_analysis(
         # 处理分钟线数据
         intraday_bars = []
         if not intraday_df.empty:
-            for _, row in intraday_df.iterrows():
-                intraday_bars.append(
-                    {
-                        "time": row["bar_time"].strftime("%H:%M"),
-                        "open": row["open"],
-                        "high": row["high"],
-                        "low": row["low"],
-                        "close": row["close"],
-                        "vol": row["vol"],
-                        "pct_chg": row["pct_chg"],
-                    }
-                )
+            # 时间列整列格式化，其余列直接转成记录，不走 iterrows
+            intraday_bars = (
+                intraday_df[["open", "high", "low", "close", "vol", "pct_chg"]]
+                .assign(time=intraday_df["bar_time"].dt.strftime("%H:%M"))
+                .to_dict("records")
+            )
 
         position_info = {"cost": position_cost, "ratio": position_ratio}
         prompt = _build_aftermarket_prompt(
@@ -1489,7 +1759,7 @@ def deepseek_aftermarket_analysis(
         )
 
         # 4. 调用 DeepSeek API
-        analysis = _call_deepseek_api(prompt)
+        analysis = _call_deepseek_cached(prompt)
         if not analysis:
             return "❌ 盘后分析失败: DeepSeek API 调用失败"
 
@@ -1523,19 +1793,27 @@ def deepseek_aftermarket_analysis(
         return f"❌ 盘后分析过程中出错: {e}"
 
 
+def _format_daily_hist_table(hist_df: pd.DataFrame) -> str:
+    """盘前/盘后 prompt 共用的历史日线表格（按列取出后 zip 逐行格式化，不走 iterrows）。"""
+    hist_lines = ["日期 | 收盘 | 涨跌% | MA5 | MA20", "--- | --- | --- | --- | ---"]
+    hist_lines.extend(
+        f"{d} | {c:.3f} | {p:.2f}% | {m5:.3f} | {m20:.3f}"
+        for d, c, p, m5, m20 in zip(
+            hist_df["trade_date"].tolist(),
+            hist_df["close"].tolist(),
+            hist_df["pct_chg"].tolist(),
+            hist_df["ma5"].tolist(),
+            hist_df["ma20"].tolist(),
+        )
+    )
+    return "\n".join(hist_lines)
+
+
 def _build_premarket_prompt(
     code: str, hist_df: pd.DataFrame, latest_data: dict, position_info: dict
 ) -> str:
     """构建盘前分析的 Prompt"""
-    # 历史数据表格
-    hist_lines = ["日期 | 收盘 | 涨跌% | MA5 | MA20"]
-    hist_lines.append("--- | --- | --- | --- | ---")
-    for _, row in hist_df.iterrows():
-        hist_lines.append(
-            f"{row['trade_date']} | {row['close']:.3f} | "
-            f"{row['pct_chg']:.2f}% | {row['ma5']:.3f} | {row['ma20']:.3f}"
-        )
-    hist_table = "\n".join(hist_lines)
+    hist_table = _format_daily_hist_table(hist_df)
 
     position_text = ""
     if position_info.get("cost"):
@@ -1603,15 +1881,7 @@ def _build_aftermarket_prompt(
     intraday_bars: list = None,
 ) -> str:
     """构建盘后分析的 Prompt"""
-    # 历史数据表格
-    hist_lines = ["日期 | 收盘 | 涨跌% | MA5 | MA20"]
-    hist_lines.append("--- | --- | --- | --- | ---")
-    for _, row in hist_df.iterrows():
-        hist_lines.append(
-            f"{row['trade_date']} | {row['close']:.3f} | "
-            f"{row['pct_chg']:.2f}% | {row['ma5']:.3f} | {row['ma20']:.3f}"
-        )
-    hist_table = "\n".join(hist_lines)
+    hist_table = _format_daily_hist_table(hist_df)
 
     # 分钟线表格（简化版，只展示开盘和收盘）
     intraday_table = "暂无分钟线数据"
@@ -1694,6 +1964,13 @@ def _build_aftermarket_prompt(
     return prompt
 
 
+def _format_t_position(position_info: dict, current_price: float) -> str:
+    """做T prompt 里的一行持仓信息（仅在有持仓成本时调用）"""
+    cost = position_info["cost"]
+    profit = (current_price - cost) / cost * 100
+    return f"持仓：成本 {cost:.3f}，仓位 {position_info['ratio']:.1%}，浮盈 {profit:+.2f}%\n"
+
+
 def _format_position_info(position_info: dict, current_price: float) -> str:
     """格式化持仓信息"""
     if not position_info.get("cost"):